@@ -1,16 +1,29 @@
 """Contains tools to visualize a reaction.
 """
+from collections import OrderedDict
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Tuple, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Tuple, Union, overload
 import typing
-from reaction_mechanizer.pathway.reaction import DifferentialEquationModel, ReactionMechanism, SimpleStep
+from reaction_mechanizer.pathway.reaction import DifferentialEquationModel, ReactionMechanism, SimpleStep, _get_mass_action_rate_partials, \
+    _get_net_transpose, _get_padded_mass_action_rates, _get_padded_orders, _get_power_str
 from scipy.integrate import odeint, solve_ivp
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import seaborn as sns
 import pandas as pd
 
+njit: Any
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the generated RHS then runs as plain Python
+    njit = None
+
+_IMPLICIT_SOLVE_IVP_METHODS = ("Radau", "BDF", "LSODA")
+# Past this many steps, generating (and jitting) a line per species costs more than it saves, so the RHS works on the stoichiometry matrices
+_MAX_GENERATED_STEPS = 64
+# Number of compiled functions each `ReactionVisualizer` keeps (ie for different species orders, or quasi-steady-state models)
+_MAX_CACHED_FUNCTIONS = 32
+
 
 class ReactionEvent(Enum):
     """Enum for the possible reaction events, such as:
@@ -28,6 +41,30 @@ class ReactionEvent(Enum):
     SMOOTH_CHANGE_CONCENTRATION = 2
 
 
+@dataclass
+class SimulationResult:
+    """Concentrations of the species in a reaction over time, kept as plain arrays (see `progress_reaction`'s `return_dataframe`).
+
+    Attributes:
+        times (Any): 1D array of the times
+        concentrations (Any): 2D array where the rows are the times and the columns are the species
+        species (List[str]): The species in the order of the columns of `concentrations`
+    """
+    times: Any
+    concentrations: Any
+    species: List[str]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get the DataFrame `progress_reaction` returns by default: a "Time" column followed by a column per species.
+
+        Returns:
+            pd.DataFrame: DataFrame representing the concentrations of the species in the reaction
+        """
+        frame = pd.DataFrame(self.concentrations, columns=self.species)
+        frame.insert(0, "Time", self.times)
+        return frame
+
+
 class ReactionVisualizer:
     """Visualier for either `SimpleStep` or `ReactionMechanism`
     """
@@ -38,40 +75,225 @@ class ReactionVisualizer:
             reaction (Union[SimpleStep, ReactionMechanism]): The reaction object to model
         """
         self.reaction: Union[SimpleStep, ReactionMechanism] = reaction
+        # Compiled ODE/Jacobian functions keyed by their generated source, so that repeated integrations (ie between events) reuse them.
+        # The rate constants are arguments rather than part of the source, so changing them (ie in a sweep) reuses the functions too.
+        self._ode_cache: "OrderedDict[str, Any]" = OrderedDict()
+        # Last differential equations/Jacobian of the reaction (by getter and arguments), along with the steps and rate constants they were built from
+        self._model_cache: Dict[Tuple[Any, ...], Tuple[Any, Any]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Compiled functions can't always be pickled (ie to send the visualizer to worker processes); they are rebuilt on demand instead
+        state = dict(self.__dict__)
+        state["_ode_cache"] = OrderedDict()
+        state["_model_cache"] = {}
+        return state
+
+    def _get_mechanism(self) -> ReactionMechanism:
+        return self.reaction if isinstance(self.reaction, ReactionMechanism) else ReactionMechanism([self.reaction])
+
+    def _get_reaction_model(self, getter: str, *args: Any) -> Any:
+        """Call the method `getter` of the reaction as a `ReactionMechanism` (ie "get_rates"), reusing its last result while the steps, \
+            their rate constants and their compositions are unchanged.
+
+        Args:
+            getter (str): The name of the method to call
+            *args (Any): Hashable arguments to call the method with
+
+        Returns:
+            Any: The result of the method
+        """
+        mechanism = self._get_mechanism()
+        # The fingerprint holds the steps themselves, so a replaced (and collected) step can't be mistaken for a new one with the same id
+        fingerprint = mechanism._get_fingerprint()
+        cached = self._model_cache.get((getter, *args))
+        if cached is None or cached[0] != fingerprint:
+            cached = (fingerprint, getattr(mechanism, getter)(*args))
+            self._model_cache[(getter, *args)] = cached
+        return cached[1]
+
+    def _get_ode_function(self,
+                          state_order: List[str],
+                          ode_override: Union[Dict[str, DifferentialEquationModel], None] = None,
+                          inverse_cur_state_and_t: bool = False) -> Any:
+        """Get the right-hand side of the system for odeint/solve_ivp: generated code for the usual (small) mechanisms, \
+            or NumPy operations on the stoichiometry matrices for large ones.
+
+        Args:
+            state_order (List[str]): The species in the order of the state vector
+            ode_override (Union[Dict[str, DifferentialEquationModel], None], optional):
+                Dictionary containing the species to override the differential equation of using the provided one. Defaults to None.
+            inverse_cur_state_and_t (bool, optional): Whether the function takes `t` first (like solve_ivp expects). Defaults to False.
+
+        Returns:
+            Any: The right-hand side function
+        """
+        if ode_override is None and len(self._get_mechanism().steps) > _MAX_GENERATED_STEPS:
+            reactant_orders, product_orders, net, kf, kr = self._get_reaction_model("get_stoichiometry_matrices", tuple(state_order))
+            return _get_mass_action_ode_function(reactant_orders, product_orders, net, kf, kr, inverse_cur_state_and_t=inverse_cur_state_and_t)
+        ode_function = _get_simple_step_ode_function(self._get_mechanism().steps,
+                                                     self._get_reaction_model("get_stoichiometry"),
+                                                     state_order,
+                                                     ode_override=ode_override,
+                                                     inverse_cur_state_and_t=inverse_cur_state_and_t,
+                                                     cache=self._ode_cache)
+        return _bind_rate_constants(ode_function, *self._get_rate_constants())
+
+    def _get_jacobian_function(self, state_order: List[str], inverse_cur_state_and_t: bool = False) -> Any:
+        """Get the analytic Jacobian of the system matching `_get_ode_function` (when no equation is overridden).
+
+        Args:
+            state_order (List[str]): The species in the order of the state vector
+            inverse_cur_state_and_t (bool, optional): Whether the function takes `t` first (like solve_ivp expects). Defaults to False.
+
+        Returns:
+            Any: The Jacobian function, returning a dense matrix
+        """
+        if len(self._get_mechanism().steps) > _MAX_GENERATED_STEPS:
+            reactant_orders, product_orders, net, kf, kr = self._get_reaction_model("get_stoichiometry_matrices", tuple(state_order))
+            return _get_mass_action_jacobian_function(reactant_orders, product_orders, net, kf, kr, inverse_cur_state_and_t=inverse_cur_state_and_t)
+        jacobian_function = _get_jacobian_function(self._get_mechanism().steps, self._get_reaction_model("get_stoichiometry"), state_order,
+                                                   inverse_cur_state_and_t=inverse_cur_state_and_t, cache=self._ode_cache)
+        return _bind_rate_constants(jacobian_function, *self._get_rate_constants())
+
+    def _get_rate_constants(self) -> Tuple[Any, Any]:
+        """Get the current forward and reverse rate constants of the steps, as the arrays the generated functions take.
+
+        Returns:
+            Tuple[Any, Any]: The forward and reverse rate constants, in the order of the steps
+        """
+        steps = self._get_mechanism().steps
+        return np.array([step.kf for step in steps], dtype=np.float64), np.array([step.kr for step in steps], dtype=np.float64)
+
+    def compile(self, species: List[str], backend: str = "scipy") -> None:
+        """Build the functions integrating this reaction over `species` ahead of time, so that the next integrations don't pay for it. \
+            The rate constants are passed to them as arguments, so changing the rate constants reuses the same functions (only making one \
+                of them 0, or equal to those of an otherwise identical step, builds new ones). With numba installed, this also runs the jit compilation that \
+                    otherwise happens during the first integration.
+
+        Args:
+            species (List[str]): The species of the state, in the order of the `initial_state` that will be given
+            backend (str, optional): The integrator the functions are for, see `get_states`. Defaults to "scipy".
+
+        Raises:
+            ValueError: If `backend` isn't "scipy" or "numbalsoda"
+        """
+        if backend == "numbalsoda":
+            if len(self._get_mechanism().steps) > _MAX_GENERATED_STEPS:
+                _get_lsoda_mass_action_function()
+            else:
+                _get_lsoda_ode_function(self._get_mechanism().steps, self._get_reaction_model("get_stoichiometry"), species, cache=self._ode_cache)
+            return
+        if backend != "scipy":
+            raise ValueError(f"Unknown backend \"{backend}\", expected \"scipy\" or \"numbalsoda\"")
+        # odeint (`get_states`) takes the state first, solve_ivp (`get_states_robust`) takes the time first
+        for inverse_cur_state_and_t in (False, True):
+            ode_function = self._get_ode_function(species, inverse_cur_state_and_t=inverse_cur_state_and_t)
+            jacobian_function = self._get_jacobian_function(species, inverse_cur_state_and_t=inverse_cur_state_and_t)
+            if njit is not None:
+                # Numba compiles for the argument types of the first call
+                arguments = (0.0, np.ones(len(species))) if inverse_cur_state_and_t else (np.ones(len(species)), 0.0)
+                ode_function(*arguments)
+                jacobian_function(*arguments)
 
     def get_states(self,
                    initial_state: Dict[str, float],
                    time_end: float,
                    number_steps: int,
                    initial_time: float = 0,
-                   ode_override: Union[Dict[str, DifferentialEquationModel], None] = None) -> Any:
+                   ode_override: Union[Dict[str, DifferentialEquationModel], None] = None,
+                   backend: str = "scipy",
+                   times: Union[Any, None] = None) -> Any:
         """Get concentration of the species in this reaction, with model specifications given.
 
         Args:
             initial_state (Dict[str, float]): initial concentration of all species in reaction
             time_end (float): The end time for this model
-            number_steps (int): The granularity of this model. The higher the number of steps, the more accurate the model.
+            number_steps (int): The number of evenly spaced times to output. The integrator picks its own internal steps to meet its \
+                tolerances, so this sets the resolution of the output rather than the accuracy of the model.
             initial_time (float, optional): The time to start the model at. Defaults to 0.
             ode_override (Union[Dict[str, DifferentialEquationModel], None], optional):
                 Dictionary containing the species to override the differential equation of using the provided one. Defaults to None.
+            backend (str, optional):
+                The integrator to use: "scipy" for `scipy.integrate.odeint` or "numbalsoda" for `numbalsoda.lsoda`, \
+                    which keeps the whole integration in compiled code (requires numba and numbalsoda). Defaults to "scipy".
+            times (Union[Any, None], optional): Non-decreasing times to get the concentrations at, the first one being the time of `initial_state`. \
+                Replaces the `number_steps` evenly spaced times between `initial_time` and `time_end` if given. Defaults to None.
 
         Returns:
             Any: 2D array where the rows represent the concentrations of the species at different times
                 (between `initial_time` and `end_time` and using `number_steps`). The columns are the species in the order given by `initial_state`
         """
-        ode_dict: Dict[str, DifferentialEquationModel] = self.reaction.get_differential_equations()
-        ode_dict_temp = {key: ode_dict[key] for key in initial_state.keys()}
-        ode_dict = ode_dict_temp
-        if ode_override is not None:
-            for key, ode in ode_override.items():
-                ode_dict[key] = ode
-        ode_function = _get_simple_step_ode_function(ode_dict, list(initial_state.keys()))
-
-        times = np.linspace(initial_time, time_end, number_steps)
-
+        if times is None:
+            times = np.linspace(initial_time, time_end, number_steps)
         cur_state = list(initial_state.values())
 
-        return odeint(ode_function, cur_state, times)
+        # odeint/solve_ivp only call back into Python (scipy.LowLevelCallable is limited to quad and friends),
+        # so a right-hand side that never leaves compiled code needs the numbalsoda integrator
+        if backend == "numbalsoda":
+            if ode_override is None and len(self._get_mechanism().steps) > _MAX_GENERATED_STEPS:
+                # One compiled function serves every large mechanism; the matrices are passed through numbalsoda's data array
+                lsoda_ode_function = _get_lsoda_mass_action_function()
+                lsoda_data = _get_lsoda_mass_action_data(*self._get_reaction_model("get_stoichiometry_matrices", tuple(initial_state.keys())))
+            else:
+                lsoda_ode_function = _get_lsoda_ode_function(self._get_mechanism().steps,
+                                                             self._get_reaction_model("get_stoichiometry"),
+                                                             list(initial_state.keys()),
+                                                             ode_override=ode_override,
+                                                             cache=self._ode_cache)
+                # The rate constants are passed through numbalsoda's data array, like the matrices of large mechanisms
+                lsoda_data = np.concatenate(self._get_rate_constants())
+            from numbalsoda import lsoda
+            data, _ = lsoda(lsoda_ode_function.address, np.array(cur_state, dtype=np.float64), times, data=lsoda_data)
+            return data
+        if backend != "scipy":
+            raise ValueError(f"Unknown backend \"{backend}\", expected \"scipy\" or \"numbalsoda\"")
+
+        ode_function = self._get_ode_function(list(initial_state.keys()), ode_override=ode_override)
+        # An overridden equation has no analytic Jacobian, so leave odeint to estimate it in that case
+        jacobian_function = None
+        if ode_override is None:
+            jacobian_function = self._get_jacobian_function(list(initial_state.keys()))
+        # A fresh odeint per call (ie per segment between events) is kept over reusing a `scipy.integrate.ode` instance: the latter returns to
+        # Python for every output time, which costs more than odeint's setup
+        return odeint(ode_function, cur_state, times, Dfun=jacobian_function)
+
+    # Typed callers get a DataFrame or a `SimulationResult` depending on `return_dataframe`, rather than the Union of both
+    @overload
+    def progress_reaction(self,
+                          initial_state: Dict[str, float],
+                          time_end: float,
+                          number_steps: int,
+                          events: Union[List[Tuple[float, ReactionEvent, Tuple[Any]]], None] = ...,
+                          out: Union[str, None] = ...,
+                          show_intermediates: bool = ...,
+                          backend: str = ...,
+                          quasi_steady_state: Union[List[str], None] = ...,
+                          return_dataframe: Literal[True] = ...) -> pd.DataFrame: ...
+
+    @overload
+    def progress_reaction(self,
+                          initial_state: Dict[str, float],
+                          time_end: float,
+                          number_steps: int,
+                          events: Union[List[Tuple[float, ReactionEvent, Tuple[Any]]], None] = ...,
+                          out: Union[str, None] = ...,
+                          show_intermediates: bool = ...,
+                          backend: str = ...,
+                          quasi_steady_state: Union[List[str], None] = ...,
+                          *,
+                          return_dataframe: Literal[False]) -> SimulationResult: ...
+
+    @overload
+    def progress_reaction(self,
+                          initial_state: Dict[str, float],
+                          time_end: float,
+                          number_steps: int,
+                          events: Union[List[Tuple[float, ReactionEvent, Tuple[Any]]], None] = ...,
+                          out: Union[str, None] = ...,
+                          show_intermediates: bool = ...,
+                          backend: str = ...,
+                          quasi_steady_state: Union[List[str], None] = ...,
+                          return_dataframe: bool = ...) -> Union[pd.DataFrame, SimulationResult]: ...
 
     def progress_reaction(self,
                           initial_state: Dict[str, float],
@@ -79,13 +301,17 @@ class ReactionVisualizer:
                           number_steps: int,
                           events: Union[List[Tuple[float, ReactionEvent, Tuple[Any]]], None] = None,
                           out: Union[str, None] = None,
-                          show_intermediates: bool = True) -> pd.DataFrame:
+                          show_intermediates: bool = True,
+                          backend: str = "scipy",
+                          quasi_steady_state: Union[List[str], None] = None,
+                          return_dataframe: bool = True) -> Union[pd.DataFrame, SimulationResult]:
         """Generate model for reaction
 
         Args:
             initial_state (Dict[str, float]): initial concentration of all species in reaction
             time_end (float): The end time for this model
-            number_steps (int): The granularity of this model. The higher the number of steps, the more accurate the model.
+            number_steps (int): The number of evenly spaced times to output. The integrator picks its own internal steps to meet its \
+                tolerances, so this sets the resolution of the output rather than the accuracy of the model.
             events (List[Tuple[float, ReactionEvent, Tuple[Any]]], optional):
                 The list of events to occur during a specified time in the reaction. \
                     A single event is represented by a tuple holding the time of the perturbation, the type of perturbation (`ReactionEvent`), \
@@ -94,61 +320,122 @@ class ReactionVisualizer:
                 If a string is added, a png visually representing the reaction is created at the specified location (and a `DataFrame` is returned). \
                     Otherwise, just the `DataFrame` is returned. Defaults to None.
             show_intermediates (bool, optional): Whether to show the intermediate species in the graph (doesn't affect dataframe or `SimpleStep`s).
+            backend (str, optional): The integrator to use, see `get_states`. Defaults to "scipy".
+            quasi_steady_state (Union[List[str], None], optional):
+                Intermediate species to eliminate from the integration using the quasi-steady-state approximation, which shrinks the system \
+                    of differential equations. Their concentrations are then derived from the other species (so their initial concentrations \
+                        are ignored, and events can't target them). Defaults to None.
+            return_dataframe (bool, optional): Whether to return a DataFrame, or a `SimulationResult` holding the arrays it would be built from \
+                (saving the copy into a DataFrame, ie in parameter sweeps). Defaults to True.
 
         Returns:
-            pd.DataFrame: DataFrame representing the concentrations of the species in the reaction
+            Union[pd.DataFrame, SimulationResult]: DataFrame (or `SimulationResult`) representing the concentrations of the species in the reaction
         """
-        data: Any = np.ndarray((0, 0))
-        if events is not None:
-            sorted_events = (*sorted(events, key=lambda x: x[0]), (time_end, None, tuple()))
-            cur_state = dict(initial_state)
-            prev_time_point_discretized: float = 0
+        quasi_steady_state_models = self._get_quasi_steady_state_models(quasi_steady_state or [])
+        integrated_state = {thing: value for thing, value in initial_state.items() if thing not in quasi_steady_state_models}
+        ode_override: Union[Dict[str, DifferentialEquationModel], None] = None
+        if len(quasi_steady_state_models) != 0:
+            ode_override = {}
+            for thing, ode in self._get_reaction_model("get_differential_equations").items():
+                if thing in integrated_state:
+                    for eliminated, model in quasi_steady_state_models.items():
+                        ode = ode.substitute(eliminated, model)
+                    ode_override[thing] = ode
 
-            for time_point, reaction_event_type, additional_info in sorted_events:
-                # First, discretize the time points so that everything is measured to the granularity of "number_steps"
-                time_interval = time_end / number_steps
-                time_point_discretized = round(time_point / time_interval) * time_interval
-
-                cur_number_steps = round((time_point - prev_time_point_discretized) / time_end * number_steps)
-
-                cur_data = self.get_states(cur_state, time_point, cur_number_steps, initial_time=prev_time_point_discretized)
-                data = cur_data if len(data) == 0 else typing.cast(Any, np.concatenate([data, cur_data]))
-
-                if reaction_event_type == ReactionEvent.CHANGE_CONCENTRATION:
-                    for index, key in enumerate(cur_state.keys()):
-                        if key == additional_info[0]:
-                            cur_state[key] = cur_data[-1, index] + additional_info[1]
-                        else:
-                            cur_state[key] = cur_data[-1, index]
-                elif reaction_event_type == ReactionEvent.SET_CONCENTRATION:
-                    for index, key in enumerate(cur_state.keys()):
-                        if key == additional_info[0]:
-                            cur_state[key] = cur_data[-1, index] + additional_info[1]
-                        else:
-                            cur_state[key] = cur_data[-1, index]
-                elif reaction_event_type == ReactionEvent.SMOOTH_CHANGE_CONCENTRATION:
-                    pass
-                prev_time_point_discretized = time_point_discretized
-        else:
-            data = self.get_states(initial_state, time_end, number_steps)
         times = np.linspace(0, time_end, number_steps)
-
-        _, ax = plt.subplots()
-        plt.tight_layout()
+        if events is not None:
+            # Events after the end of the model never happen
+            sorted_events = (*sorted((event for event in events if event[0] <= time_end), key=lambda x: x[0]), (time_end, None, tuple()))
+            # Each segment fills the rows of the times before its event (the rows from its event onwards are after the event),
+            # except the last one, which runs up to and including `time_end`
+            offsets = np.append(np.searchsorted(times, [event[0] for event in sorted_events[:-1]]), number_steps)
+
+            species = list(integrated_state.keys())
+            cur_state = np.array(list(integrated_state.values()), dtype=float)
+            data = np.empty((number_steps, len(integrated_state)))
+            prev_time_point: float = 0
+            for (time_point, reaction_event_type, additional_info), start, end in zip(sorted_events, [0, *offsets], offsets):
+                last_state = cur_state
+                if time_point > prev_time_point:
+                    # Integrate from the previous event, through the rows of this segment, to this event (without repeating a starting
+                    # or ending time that is also a row, ie `time_end` for the last segment, which not every integrator accepts).
+                    # The rows are compared up to rounding, as an event at 3.3 has a row at 3.3000000000000003 with `np.linspace`.
+                    leading = [] if start < end and np.isclose(times[start], prev_time_point, rtol=1e-12, atol=0) else [prev_time_point]
+                    trailing = [] if start < end and np.isclose(times[end - 1], time_point, rtol=1e-12, atol=0) else [time_point]
+                    segment_times = np.concatenate([leading, times[start:end], trailing])
+                    cur_data = self.get_states(dict(zip(species, cur_state)), time_point, len(segment_times),
+                                               ode_override=ode_override, backend=backend, times=segment_times)
+                    data[start:end] = cur_data[len(leading):len(leading) + end - start]
+                    last_state = cur_data[-1]
+                else:
+                    # No time passes (ie an event at `time_end`), so the rows of this segment are at the time of the previous event
+                    data[start:end] = cur_state
+                cur_state = _apply_reaction_event(species, last_state, reaction_event_type, additional_info)
+                prev_time_point = time_point
+        else:
+            data = self.get_states(integrated_state, time_end, number_steps, ode_override=ode_override, backend=backend, times=times)
+
+        if len(quasi_steady_state_models) != 0:
+            columns = {thing: data[:, i] for i, thing in enumerate(integrated_state.keys())}
+            for thing, model in quasi_steady_state_models.items():
+                # The rows of `data.T` are the integrated species, so the model indexes them directly instead of going through keyword arguments
+                columns[thing] = model.get_lambda_positional(list(integrated_state.keys()))(data.T) * np.ones(len(times))
+            data = np.column_stack([columns[thing] for thing in initial_state.keys()])
+        result = SimulationResult(times, data, list(initial_state.keys()))
+        if not return_dataframe and not out:
+            return result
+        df = result.to_frame()
         if out:
-            dont_show: List[str] = []
-            if not show_intermediates and type(self.reaction) == ReactionMechanism:
-                dont_show.extend(self.reaction.get_intermediates())
-            for i, thing in enumerate(initial_state.keys()):
-                if thing not in dont_show:
-                    sns.lineplot(x=times, y=data[:, i], label="$"+thing+"$", ax=ax)
-            ax.legend()
-            sns.despine(ax=ax)
-            ax.margins(x=0, y=0)
-            _, top = ax.get_ylim()
-            ax.set_ylim([0, top*1.05])
-            plt.savefig(str(out), bbox_inches="tight", dpi=600)
-        return pd.DataFrame({"Time": times, **{thing: data[:, i] for i, thing in enumerate(initial_state.keys())}})
+            self._plot_progress(df, out, show_intermediates)
+        return df if return_dataframe else result
+
+    def progress_reactions_batch(self,
+                                 initial_states: List[Dict[str, float]],
+                                 time_end: float,
+                                 number_steps: int,
+                                 n_jobs: int = -1,
+                                 prefer: Union[str, None] = None,
+                                 **progress_reaction_args) -> List[Union[pd.DataFrame, SimulationResult]]:
+        """Generate models for the reaction from several initial states (ie a parameter sweep), in parallel if joblib is installed.
+
+        Args:
+            initial_states (List[Dict[str, float]]): The initial concentrations of all species in reaction, one dictionary per model
+            time_end (float): The end time for the models
+            number_steps (int): The number of evenly spaced times to output for each model (see `progress_reaction`).
+            n_jobs (int, optional): The number of workers to use (-1 uses all cores). Defaults to -1.
+            prefer (Union[str, None], optional): "processes" or "threads" (see `joblib.Parallel`). Threads share this visualizer's compiled \
+                functions instead of rebuilding them in every worker, and scale when the integrations release the GIL. Defaults to None (processes).
+            progress_reaction_args: Any other arguments to pass to `progress_reaction`
+
+        Returns:
+            List[Union[pd.DataFrame, SimulationResult]]: The results of `progress_reaction`, in the order of `initial_states`
+        """
+        try:
+            from joblib import Parallel, delayed
+        except ImportError:  # joblib is optional; run the models one after the other
+            return [self.progress_reaction(initial_state, time_end, number_steps, **progress_reaction_args) for initial_state in initial_states]
+        return typing.cast(List[Union[pd.DataFrame, SimulationResult]], Parallel(n_jobs=n_jobs, prefer=prefer)(
+            delayed(self.progress_reaction)(initial_state, time_end, number_steps, **progress_reaction_args) for initial_state in initial_states))
+
+    def _get_quasi_steady_state_models(self, species: List[str]) -> Dict[str, DifferentialEquationModel]:
+        """Get the quasi-steady-state concentration models of `species`, making sure none of them depends on another eliminated species.
+
+        Args:
+            species (List[str]): The species to eliminate
+
+        Raises:
+            ReactionMechanism.MechanismException: If a model can't be derived, or depends on another species in `species`
+
+        Returns:
+            Dict[str, DifferentialEquationModel]: Dictionary with the eliminated species as keys and their concentration models as values
+        """
+        mechanism = self._get_mechanism()
+        models = {thing: mechanism.get_quasi_steady_state(thing) for thing in species}
+        for thing, model in models.items():
+            for other in species:
+                if f"""kwargs["{other}"]""" in model.model_str:
+                    raise ReactionMechanism.MechanismException(f"The quasi-steady state of \"{thing}\" depends on \"{other}\", which is also eliminated")
+        return models
 
     def get_states_robust(self,
                           initial_state: Dict[str, float],
@@ -162,7 +449,6 @@ class ReactionVisualizer:
         Args:
             initial_state (Dict[str, float]): initial concentration of all species in reaction
             time_end (float): The end time for this model
-            number_steps (int): The granularity of this model. The higher the number of steps, the more accurate the model.
             initial_time (float, optional): The time to start the model at. Defaults to 0.
             ode_override (Union[Dict[str, DifferentialEquationModel], None], optional):
                 Dictionary containing the species to override the differential equation of using the provided one. Defaults to None.
@@ -171,13 +457,14 @@ class ReactionVisualizer:
             Any: 2D array where the rows represent the concentrations of the species at different times
                 (between `initial_time` and `end_time` and using `number_steps`). The columns are the species in the order given by `initial_state`
         """
-        ode_dict: Dict[str, DifferentialEquationModel] = self.reaction.get_differential_equations()
-        ode_dict_temp = {key: ode_dict[key] for key in initial_state.keys()}
-        ode_dict = ode_dict_temp
-        if ode_override is not None:
-            for key, ode in ode_override.items():
-                ode_dict[key] = ode
-        ode_function = _get_simple_step_ode_function(ode_dict, list(initial_state.keys()), inverse_cur_state_and_t=True)
+        ode_function = self._get_ode_function(list(initial_state.keys()), ode_override=ode_override, inverse_cur_state_and_t=True)
+        method = kwargs_solve_ivp.get("method")
+        if "jac" not in kwargs_solve_ivp and method in _IMPLICIT_SOLVE_IVP_METHODS:
+            if ode_override is None:
+                kwargs_solve_ivp["jac"] = self._get_jacobian_function(list(initial_state.keys()), inverse_cur_state_and_t=True)
+            elif method != "LSODA":
+                # The Jacobian has to be estimated by finite differences, which can then evaluate all of its columns in a single call
+                kwargs_solve_ivp.setdefault("vectorized", True)
 
         cur_state = list(initial_state.values())
         return solve_ivp(ode_function, (initial_time, time_end), cur_state, **kwargs_solve_ivp)
@@ -194,7 +481,6 @@ class ReactionVisualizer:
         Args:
             initial_state (Dict[str, float]): initial concentration of all species in reaction
             time_end (float): The end time for this model
-            number_steps (int): The granularity of this model. The higher the number of steps, the more accurate the model.
             events (Union[List[Tuple[float, ReactionEvent, Tuple[Any]]], None], optional):
                 The list of events to occur during a specified time in the reaction. \
                     A single event is represented by a tuple holding the time of the perturbation, the type of perturbation (`ReactionEvent`), \
@@ -207,52 +493,64 @@ class ReactionVisualizer:
         Returns:
             pd.DataFrame: DataFrame representing the concentrations of the species in the reaction
         """
-        data: Any = np.ndarray((0, 0))
         if events is not None:
-            print(events)
-            sorted_events = (*sorted(events, key=lambda x: x[0]), (time_end, None, tuple()))
-            cur_state = dict(initial_state)
+            # Events after the end of the model never happen
+            sorted_events = (*sorted((event for event in events if event[0] <= time_end), key=lambda x: x[0]), (time_end, None, tuple()))
+            species = list(initial_state.keys())
+            cur_state = np.array(list(initial_state.values()), dtype=float)
             prev_time_point: float = 0
+            times_chunks: List[Any] = []
+            concentrations_chunks: List[Any] = []
 
             for time_point, reaction_event_type, additional_info in sorted_events:
 
-                cur_data = self.get_states_robust(cur_state, time_point, initial_time=prev_time_point, **kwargs_solve_ivp)
-                data = cur_data if len(data) == 0 else typing.cast(Any, np.concatenate([data, cur_data]))
-
-                if reaction_event_type == ReactionEvent.CHANGE_CONCENTRATION:
-                    for index, key in enumerate(cur_state.keys()):
-                        if key == additional_info[0]:
-                            cur_state[key] = cur_data[-1, index] + additional_info[1]
-                        else:
-                            cur_state[key] = cur_data[-1, index]
-                elif reaction_event_type == ReactionEvent.SET_CONCENTRATION:
-                    for index, key in enumerate(cur_state.keys()):
-                        if key == additional_info[0]:
-                            cur_state[key] = cur_data[-1, index] + additional_info[1]
-                        else:
-                            cur_state[key] = cur_data[-1, index]
-                elif reaction_event_type == ReactionEvent.SMOOTH_CHANGE_CONCENTRATION:
-                    pass
+                cur_data = self.get_states_robust(dict(zip(species, cur_state)), time_point, initial_time=prev_time_point, **kwargs_solve_ivp)
+                times_chunks.append(cur_data.t)
+                concentrations_chunks.append(cur_data.y)
+
+                cur_state = _apply_reaction_event(species, cur_data.y[:, -1], reaction_event_type, additional_info)
                 prev_time_point = time_point
+            times = np.concatenate(times_chunks)
+            concentrations = np.concatenate(concentrations_chunks, axis=1)
         else:
             data = self.get_states_robust(initial_state, time_end, **kwargs_solve_ivp)
+            times, concentrations = data.t, data.y
 
-        _, ax = plt.subplots()
-        plt.tight_layout()
+        df = pd.DataFrame({"Time": times, **{thing: concentrations[i, :] for i, thing in enumerate(initial_state.keys())}})
         if out:
-            dont_show: List[str] = []
-            if not show_intermediates and type(self.reaction) == ReactionMechanism:
-                dont_show.extend(self.reaction.get_intermediates())
-            for i, thing in enumerate(initial_state.keys()):
-                if thing not in dont_show:
-                    sns.lineplot(x=data.t, y=data.y[i, :], label="$"+thing+"$", ax=ax)
-            ax.legend()
-            sns.despine(ax=ax)
-            ax.margins(x=0, y=0)
-            _, top = ax.get_ylim()
-            ax.set_ylim([0, top*1.05])
-            plt.savefig(str(out), bbox_inches="tight", dpi=600)
-        return pd.DataFrame({"Time": data.t, **{thing: data.y[i, :] for i, thing in enumerate(initial_state.keys())}})
+            self._plot_progress(df, out, show_intermediates)
+        return df
+
+    def _plot_progress(self, df: pd.DataFrame, out: str, show_intermediates: bool) -> None:
+        """Save a png of the concentrations in `df` (as returned by `progress_reaction`) at `out`, drawing all species in a single `ax.plot` call.
+
+        Args:
+            df (pd.DataFrame): DataFrame with a "Time" column and a column of concentrations for every species
+            out (str): The location to save the png at
+            show_intermediates (bool): Whether to show the intermediate species in the graph
+        """
+        # Plotting libraries are imported lazily as they are slow to import and aren't needed to only simulate the reaction
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        dont_show: List[str] = []
+        if not show_intermediates and isinstance(self.reaction, ReactionMechanism):
+            dont_show = self.reaction.get_intermediates()
+        shown = df.drop(columns=["Time", *dont_show], errors="ignore")
+
+        fig, ax = plt.subplots()
+        ax.plot(df["Time"].to_numpy(), shown.to_numpy())
+        ax.legend([f"${spec}$" for spec in shown.columns], title="Species")
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Concentration")
+        sns.despine(ax=ax)
+        ax.margins(x=0, y=0)
+        _, top = ax.get_ylim()
+        ax.set_ylim([0, top*1.05])
+        plt.tight_layout()
+        plt.savefig(str(out), bbox_inches="tight", dpi=600)
+        # Otherwise every call (ie in a parameter sweep) would keep its figure alive
+        plt.close(fig)
 
     def animate_progress_reaction(self,
                                   video_destination_no_extension: str,
@@ -270,56 +568,367 @@ class ReactionVisualizer:
             extension (str, optional): The extensions of the video [example values: "mp4", "gif", "mov", etc]. Defaults to "mp4".
             uses_robust (bool, optional): Whether or not to use "self.progress_reaction" or "self.progress_reaction_robust"
         """
-        df = self.progress_reaction(**progress_reaction_args) if not uses_robust else self.progress_reaction_robust(**progress_reaction_args)
-        if not progress_reaction_args.get("show_intermediates", True) and type(self.reaction) == ReactionMechanism:
-            df = df.drop(self.reaction.get_intermediates(), axis="columns")
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+        import seaborn as sns
+
+        result = self.progress_reaction(**progress_reaction_args) if not uses_robust else self.progress_reaction_robust(**progress_reaction_args)
+        df = result.to_frame() if isinstance(result, SimulationResult) else result
+        if not progress_reaction_args.get("show_intermediates", True) and isinstance(self.reaction, ReactionMechanism):
+            df = df.drop(columns=self.reaction.get_intermediates(), errors="ignore")
         writer = animation.writers["ffmpeg"](fps=fps, metadata={"artist": "ReactionMechanizer"}, bitrate=1800)  # Non-python dependency!
-        _, dummy_ax = plt.subplots()
-        plt.tight_layout()
-        df2 = df.drop("Time", axis="columns").stack().reset_index()  # level_1: species, 0: concentration values
-        df2 = df2.rename({"level_1": "Species", 0: "Concentration"}, axis="columns")
-        df2["Time"] = [cur_time for cur_time in df["Time"] for _ in df2["Species"].unique()]
-        sns.lineplot(x="Time", y="Concentration", data=df2, hue="Species", ax=dummy_ax)
-        _, top_y = dummy_ax.get_ylim()
-        _, top_x = dummy_ax.get_xlim()
+        species_list = [spec for spec in df.columns if spec != "Time"]
+        times = df["Time"].to_numpy()
+        concentrations = df[species_list].to_numpy()
+        number_frames = int(video_length*fps)
+        # The last row of the data shown at each frame
+        frame_ends = np.linspace(0, len(times) - 1, number_frames).astype(int) + 1
 
         new_fig, new_ax = plt.subplots()
-
-        data_1_item = df2.iloc[:len(df2["Species"].unique())]
-        cur_data: Dict[str, Dict[str, List[float]]] = \
-            {spec: {"x": [data_1_item["Time"].iloc[0]], "y": [data_1_item["Concentration"].iloc[i]]}
-             for i, spec in enumerate(df2["Species"].unique())}
-        sns.lineplot(x="Time", y="Concentration", data=data_1_item, hue="Species", ax=new_ax)
-        new_ax.set_ylim([0, top_y*1.05])
-        new_ax.set_xlim([0, top_x*1.05])
+        lines = tuple(new_ax.plot([], [], label=spec)[0] for spec in species_list)
+        new_ax.legend(title="Species")
+        new_ax.set_xlabel("Time")
+        new_ax.set_ylabel("Concentration")
+        new_ax.set_ylim([0, concentrations.max()*1.05])
+        new_ax.set_xlim([0, times.max()*1.05])
         new_ax.margins(x=0, y=0)
         sns.despine(ax=new_ax)
 
         def animate(frame_index):
-            for i, spec in enumerate(df2["Species"].unique()):
-                cur_data[spec]["x"].append(df["Time"].iloc[int(frame_index/(video_length*fps)*df.shape[0])])
-                cur_data[spec]["y"].append(df[spec].iloc[int(frame_index/(video_length*fps)*df.shape[0])])
-                new_ax.get_lines()[i].set_data(cur_data[spec]["x"], cur_data[spec]["y"])
-        ani = animation.FuncAnimation(new_fig, animate, frames=video_length*fps, repeat=True)
+            frame_end = frame_ends[frame_index]
+            for i, line in enumerate(lines):
+                line.set_data(times[:frame_end], concentrations[:frame_end, i])
+        ani = animation.FuncAnimation(new_fig, animate, frames=number_frames, repeat=True)
         ani.save(f"{video_destination_no_extension}.{extension}", writer=writer)
 
 
-def _get_simple_step_ode_function(differential_equations: Dict[str, DifferentialEquationModel], state_order: List[str], inverse_cur_state_and_t: bool = False):
-    active_odes = {key: val.get_lambda() for key, val in differential_equations.items()}
-
-    def simple_step_ode_function(cur_state, t):
-        cur_state_order = state_order
-        dict_state = {thing: val for thing, val in zip(cur_state_order, cur_state)}
-        out = []
-        for _, ode in active_odes.items():
-            out.append(ode(**dict_state))
-        return out
-
-    def simple_step_ode_function_params_inversed(t, cur_state):
-        cur_state_order = state_order
-        dict_state = {thing: val for thing, val in zip(cur_state_order, cur_state)}
-        out = []
-        for _, ode in active_odes.items():
-            out.append(ode(**dict_state))
-        return out
-    return simple_step_ode_function if not inverse_cur_state_and_t else simple_step_ode_function_params_inversed
+def _apply_reaction_event(species: List[str],
+                          last_state: Any,
+                          reaction_event_type: Union[ReactionEvent, None],
+                          additional_info: Tuple[Any, ...]) -> Any:
+    """Get the state to resume the reaction from after a `ReactionEvent`.
+
+    Args:
+        species (List[str]): The species in the order of `last_state`
+        last_state (Any): The concentrations of the species right before the event
+        reaction_event_type (Union[ReactionEvent, None]): The type of event (None if there is no event)
+        additional_info (Tuple[Any, ...]): The additional information associated with the event
+
+    Raises:
+        ValueError: If the event targets a species that isn't in `species`
+
+    Returns:
+        Any: Array of the concentrations of the species right after the event (a copy, `last_state` is left untouched)
+    """
+    cur_state = np.array(last_state, dtype=float)
+    if reaction_event_type in (ReactionEvent.CHANGE_CONCENTRATION, ReactionEvent.SET_CONCENTRATION):
+        if additional_info[0] not in species:
+            raise ValueError(f"The event targets \"{additional_info[0]}\", which isn't integrated (expected one of {species})")
+        index = species.index(additional_info[0])
+        if reaction_event_type == ReactionEvent.CHANGE_CONCENTRATION:
+            cur_state[index] += additional_info[1]
+        else:
+            cur_state[index] = additional_info[1]
+    return cur_state
+
+
+def _get_simple_step_ode_function(steps: List[SimpleStep],
+                                  stoichiometry: Dict[str, Dict[int, float]],
+                                  state_order: List[str],
+                                  ode_override: Union[Dict[str, DifferentialEquationModel], None] = None,
+                                  inverse_cur_state_and_t: bool = False,
+                                  cache: Union["OrderedDict[str, Any]", None] = None):
+    """Fuse the differential equations into a single function of the positional state vector and the arrays of rate constants \
+        (jitted with numba when it is installed). See `_bind_rate_constants` for the function odeint and solve_ivp expect."""
+    arguments = "t, cur_state" if inverse_cur_state_and_t else "cur_state, t"
+    # `cur_state` may also be a 2D array holding one state per column (solve_ivp's `vectorized` option)
+    lines = [f"def simple_step_ode_function({arguments}, kf, kr):", "    out = np.empty_like(cur_state)"]
+    lines.extend(_get_ode_function_body(steps, stoichiometry, state_order, ode_override))
+    lines.append("    return out")
+    return _compile_generated_function(lines, "simple_step_ode_function", cache=cache)
+
+
+def _get_mass_action_ode_function(reactant_orders: Any, product_orders: Any, net: Any, kf: Any, kr: Any, inverse_cur_state_and_t: bool = False):
+    """Build the right-hand side from the matrices of `ReactionMechanism.get_stoichiometry_matrices`, so that every evaluation is a \
+        single compiled loop (or a fixed number of NumPy operations without numba) however many species and steps there are."""
+    reactant_index, reactant_exponents = _get_padded_orders(reactant_orders)
+    product_index, product_exponents = _get_padded_orders(product_orders)
+    net_transpose = _get_net_transpose(net)
+
+    def mass_action_derivatives(cur_state):
+        if njit is not None and np.ndim(cur_state) == 1:
+            return _mass_action_derivatives(np.asarray(cur_state, dtype=np.float64), reactant_index, reactant_exponents,
+                                            product_index, product_exponents, kf, kr)
+        # Without numba, the per-step loop of `_mass_action_derivatives` runs as Python, which is much slower than NumPy operations on the
+        # padded orders. A 2D array holds one state per column (solve_ivp's `vectorized` option).
+        return net_transpose @ _get_padded_mass_action_rates(cur_state, reactant_index, reactant_exponents, product_index, product_exponents, kf, kr)
+
+    # The wrapper itself stays in Python, since odeint and solve_ivp call it with their own argument conventions
+    if inverse_cur_state_and_t:
+        def mass_action_ode_function(t, cur_state):
+            return mass_action_derivatives(cur_state)
+    else:
+        def mass_action_ode_function(cur_state, t):  # type: ignore[misc]
+            return mass_action_derivatives(cur_state)
+    return mass_action_ode_function
+
+
+def _mass_action_derivatives(cur_state: Any, reactant_index: Any, reactant_exponents: Any, product_index: Any, product_exponents: Any,
+                             kf: Any, kr: Any) -> Any:
+    """Get the rates of change of the species from the padded orders of `_get_padded_orders`, so that each step only visits the species \
+        it involves. As the orders are the stoichiometric coefficients, the step's rate is taken from its reactants and given to its products."""
+    out = np.zeros(len(cur_state))
+    for j in range(len(kf)):
+        rate = _mass_action_product(cur_state, reactant_index, reactant_exponents, j, kf[j]) \
+            - _mass_action_product(cur_state, product_index, product_exponents, j, kr[j])
+        for r in range(reactant_index.shape[1]):
+            out[int(reactant_index[j, r])] -= reactant_exponents[j, r] * rate
+        for r in range(product_index.shape[1]):
+            out[int(product_index[j, r])] += product_exponents[j, r] * rate
+    return out
+
+
+def _mass_action_product(cur_state: Any, index: Any, exponents: Any, j: int, k: float) -> float:
+    """Get `k` times the concentrations of the species of step `j` in the padded orders of `_get_padded_orders` raised to their orders."""
+    if k == 0:
+        # Irreversible steps skip their reverse rate entirely
+        return 0.0
+    for r in range(index.shape[1]):
+        # First and second order are by far the most common, and multiplications are much cheaper than a float power
+        concentration = cur_state[int(index[j, r])]
+        if exponents[j, r] == 1:
+            k *= concentration
+        elif exponents[j, r] == 2:
+            k *= concentration * concentration
+        elif exponents[j, r] != 0:
+            k *= concentration ** exponents[j, r]
+    return k
+
+
+def _get_mass_action_jacobian_function(reactant_orders: Any, product_orders: Any, net: Any, kf: Any, kr: Any, inverse_cur_state_and_t: bool = False):
+    """Build the dense Jacobian matching `_get_mass_action_ode_function` from the same matrices (a compiled loop, or NumPy operations \
+        on the whole matrices without numba)."""
+    reactant_index, reactant_exponents = _get_padded_orders(reactant_orders)
+    product_index, product_exponents = _get_padded_orders(product_orders)
+    net_transpose = _get_net_transpose(net)
+
+    def mass_action_jacobian(cur_state):
+        cur_state = np.asarray(cur_state, dtype=np.float64)
+        if njit is None:
+            return net_transpose @ (_get_mass_action_rate_partials(cur_state, reactant_index, reactant_exponents, kf)
+                                    - _get_mass_action_rate_partials(cur_state, product_index, product_exponents, kr))
+        return _mass_action_jacobian(cur_state, reactant_index, reactant_exponents, product_index, product_exponents, kf, kr)
+
+    if inverse_cur_state_and_t:
+        def mass_action_jacobian_function(t, cur_state):
+            return mass_action_jacobian(cur_state)
+    else:
+        def mass_action_jacobian_function(cur_state, t):  # type: ignore[misc]
+            return mass_action_jacobian(cur_state)
+    return mass_action_jacobian_function
+
+
+def _mass_action_jacobian(cur_state: Any, reactant_index: Any, reactant_exponents: Any, product_index: Any, product_exponents: Any,
+                          kf: Any, kr: Any) -> Any:
+    """Get the Jacobian of `_mass_action_derivatives`. The partial derivative of a step's forward rate with respect to species `k` is \
+        `kf*R[k]*y[k]**(R[k] - 1)*prod(y[l]**R[l] for l != k)` (and likewise for its reverse rate), and only the species of the step are visited."""
+    out = np.zeros((len(cur_state), len(cur_state)))
+    for j in range(len(kf)):
+        for index, exponents, k in ((reactant_index, reactant_exponents, kf[j]), (product_index, product_exponents, -kr[j])):
+            for r in range(index.shape[1]):
+                if exponents[j, r] == 0:
+                    continue
+                wrt = int(index[j, r])
+                partial = k * exponents[j, r] * cur_state[wrt] ** (exponents[j, r] - 1)
+                for q in range(index.shape[1]):
+                    if q != r and exponents[j, q] != 0:
+                        partial *= cur_state[int(index[j, q])] ** exponents[j, q]
+                # The step's rate is taken from its reactants and given to its products
+                for q in range(reactant_index.shape[1]):
+                    out[int(reactant_index[j, q]), wrt] -= reactant_exponents[j, q] * partial
+                for q in range(product_index.shape[1]):
+                    out[int(product_index[j, q]), wrt] += product_exponents[j, q] * partial
+    return out
+
+
+if njit is not None:
+    # Unlike the generated functions, these have a source file, so numba can keep their machine code between sessions
+    _mass_action_product = njit(cache=True)(_mass_action_product)
+    _mass_action_derivatives = njit(cache=True)(_mass_action_derivatives)
+    _mass_action_jacobian = njit(cache=True)(_mass_action_jacobian)
+
+
+def _get_lsoda_ode_function(steps: List[SimpleStep],
+                            stoichiometry: Dict[str, Dict[int, float]],
+                            state_order: List[str],
+                            ode_override: Union[Dict[str, DifferentialEquationModel], None] = None,
+                            cache: Union["OrderedDict[str, Any]", None] = None):
+    """Fuse the differential equations into a numba `cfunc` with the signature expected by `numbalsoda.lsoda`. The forward and \
+        then the reverse rate constants of the steps are read from the data array."""
+    try:
+        from numba import carray, cfunc  # type: ignore[attr-defined]
+        from numbalsoda import lsoda_sig
+    except ImportError as e:
+        raise ImportError("The numbalsoda backend requires both numba and numbalsoda to be installed") from e
+    lines = ["def lsoda_ode_function(t, cur_state, out, p):",
+             f"    rate_constants = carray(p, {2 * len(steps)})",
+             f"    kf = rate_constants[:{len(steps)}]",
+             f"    kr = rate_constants[{len(steps)}:]"]
+    lines.extend(_get_ode_function_body(steps, stoichiometry, state_order, ode_override))
+    return _compile_generated_function(lines, "lsoda_ode_function", cache=cache, decorator=cfunc(lsoda_sig), names={"carray": carray})
+
+
+@lru_cache(maxsize=None)
+def _get_lsoda_mass_action_function():
+    """Build the numba `cfunc` for `numbalsoda.lsoda` that evaluates `_mass_action_derivatives` on the padded orders packed by \
+        `_get_lsoda_mass_action_data` (compiled once, and reused by every mechanism)."""
+    try:
+        from numba import carray, cfunc  # type: ignore[attr-defined]
+        from numbalsoda import lsoda_sig
+    except ImportError as e:
+        raise ImportError("The numbalsoda backend requires both numba and numbalsoda to be installed") from e
+
+    @cfunc(lsoda_sig, cache=True)
+    def lsoda_mass_action_function(t, cur_state, out, p):
+        shape = carray(p, 4)
+        number_steps, number_species, reactant_width, product_width = int(shape[0]), int(shape[1]), int(shape[2]), int(shape[3])
+        reactant_size, product_size = number_steps * reactant_width, number_steps * product_width
+        data = carray(p, 4 + 2 * reactant_size + 2 * product_size + 2 * number_steps)
+        start = 4
+        reactant_index = data[start:start + reactant_size].reshape((number_steps, reactant_width))
+        start += reactant_size
+        reactant_exponents = data[start:start + reactant_size].reshape((number_steps, reactant_width))
+        start += reactant_size
+        product_index = data[start:start + product_size].reshape((number_steps, product_width))
+        start += product_size
+        product_exponents = data[start:start + product_size].reshape((number_steps, product_width))
+        start += product_size
+        kf = data[start:start + number_steps]
+        kr = data[start + number_steps:]
+        derivatives = _mass_action_derivatives(carray(cur_state, number_species), reactant_index, reactant_exponents,
+                                               product_index, product_exponents, kf, kr)
+        for i in range(number_species):
+            out[i] = derivatives[i]
+    return lsoda_mass_action_function
+
+
+def _get_lsoda_mass_action_data(reactant_orders: Any, product_orders: Any, net: Any, kf: Any, kr: Any) -> Any:
+    """Pack the padded orders (see `_get_padded_orders`) of the matrices of `ReactionMechanism.get_stoichiometry_matrices` (and their shapes) \
+        into the flat array `_get_lsoda_mass_action_function` expects."""
+    reactant_index, reactant_exponents = _get_padded_orders(reactant_orders)
+    product_index, product_exponents = _get_padded_orders(product_orders)
+    shape = [net.shape[0], net.shape[1], reactant_index.shape[1], product_index.shape[1]]
+    return np.concatenate([shape, reactant_index.ravel(), reactant_exponents.ravel(), product_index.ravel(), product_exponents.ravel(),
+                           kf, kr]).astype(np.float64)
+
+
+def _get_ode_function_body(steps: List[SimpleStep],
+                           stoichiometry: Dict[str, Dict[int, float]],
+                           state_order: List[str],
+                           ode_override: Union[Dict[str, DifferentialEquationModel], None]) -> List[str]:
+    """Get the lines computing `out` from `cur_state` and the rate constant arrays `kf` and `kr`. The rate of each step is computed once \
+    and shared by all the species it involves (and by the steps with the same orders and rate constants), except for the species in \
+    `ode_override`, which use their given differential equation instead. Only which rate constants are 0 or equal is part of the source, \
+    so it is the same for most other sets of rate constants."""
+    ode_override = ode_override or {}
+    lines = [f"    x{i} = cur_state[{i}]" for i in range(len(state_order))]
+    # Only the rates some non-overridden species depends on (the others might involve species that aren't in the state)
+    used_steps = sorted({j for thing in state_order if thing not in ode_override for j in stoichiometry.get(thing, {}).keys()})
+    # The step whose rate each step uses, for the steps contributing something
+    rate_steps: Dict[int, int] = {}
+    shared_rates: Dict[Tuple[Any, ...], int] = {}
+    for j in used_steps:
+        step = steps[j]
+        if step.kf == 0 and step.kr == 0:
+            # Both rate constants are 0, so the step contributes nothing
+            continue
+        key = (step.kf, step.kr, tuple(sorted(step.reactants.items())), tuple(sorted(step.products.items())))
+        if key in shared_rates:
+            rate_steps[j] = shared_rates[key]
+            continue
+        shared_rates[key] = rate_steps[j] = j
+        terms = [*([_get_mass_action_term(f"kf[{j}]", step.reactants)] if step.kf != 0 else []),
+                 *([_get_mass_action_term(f"kr[{j}]", step.products)] if step.kr != 0 else [])]
+        expression = " - ".join(terms) if step.kf != 0 else f"-{terms[0]}"
+        lines.append(f"    r{j} = {DifferentialEquationModel(expression).get_positional_str(state_order, 'x{}')}")
+    for i, thing in enumerate(state_order):
+        if thing in ode_override:
+            expression = ode_override[thing].get_positional_str(state_order, 'x{}')
+        else:
+            # The coefficients of the steps sharing a rate are combined, and dropped if they cancel out
+            coefs: Dict[int, float] = {}
+            for j, coef in stoichiometry.get(thing, {}).items():
+                if j in rate_steps:
+                    coefs[rate_steps[j]] = coefs.get(rate_steps[j], 0) + coef
+            expression = " + ".join(f"{coef}*r{j}" for j, coef in coefs.items() if coef != 0) or "0"
+        lines.append(f"    out[{i}] = {expression}")
+    return lines
+
+
+def _get_jacobian_function(steps: List[SimpleStep],
+                           stoichiometry: Dict[str, Dict[int, float]],
+                           state_order: List[str],
+                           inverse_cur_state_and_t: bool = False,
+                           cache: Union["OrderedDict[str, Any]", None] = None):
+    """Build the dense Jacobian matrix function matching `_get_simple_step_ode_function`, taking the same arguments \
+        (jitted with numba when it is installed)."""
+    index = {thing: i for i, thing in enumerate(state_order)}
+    arguments = "t, cur_state" if inverse_cur_state_and_t else "cur_state, t"
+    lines = [f"def jacobian_function({arguments}, kf, kr):"]
+    lines.extend(f"    x{i} = cur_state[{i}]" for i in range(len(state_order)))
+    lines.append(f"    out = np.zeros(({len(state_order)}, {len(state_order)}))")
+    entries: Dict[Tuple[int, int], List[str]] = {}
+    for j, step in enumerate(steps):
+        # Partial derivatives of the step's rate with respect to each of its species
+        rate_partials: Dict[str, List[str]] = {}
+        for constant, sign, species in ((f"kf[{j}]", "", step.reactants), (f"kr[{j}]", "-", step.products)):
+            if (step.kf if constant.startswith("kf") else step.kr) == 0:
+                continue
+            for wrt, exponent in species.items():
+                others = {thing: coef for thing, coef in species.items() if thing != wrt}
+                factor = f"{sign}{exponent}*{_get_power_str(wrt, exponent - 1)}"
+                rate_partials.setdefault(wrt, []).append(f"{factor}*{_get_mass_action_term(constant, others)}")
+        for thing, coefs in stoichiometry.items():
+            if j in coefs and thing in index:
+                for wrt, partials in rate_partials.items():
+                    entries.setdefault((index[thing], index[wrt]), []).append(f"{coefs[j]}*({' + '.join(partials)})")
+    for (i, k), terms in entries.items():
+        lines.append(f"    out[{i}, {k}] = {DifferentialEquationModel(' + '.join(terms)).get_positional_str(state_order, 'x{}')}")
+    lines.append("    return out")
+    return _compile_generated_function(lines, "jacobian_function", cache=cache)
+
+
+def _get_mass_action_term(constant: str, species: Dict[str, float]) -> str:
+    """Get the model string of `constant` times the concentrations of `species` raised to their orders."""
+    return "*".join([constant, *[_get_power_str(thing, coef) for thing, coef in species.items()]])
+
+
+def _bind_rate_constants(function: Any, kf: Any, kr: Any):
+    """Bind the rate constant arguments of a generated function, giving the function of `(cur_state, t)` (or `(t, cur_state)`) \
+        odeint and solve_ivp expect."""
+    def bound_function(first, second):
+        return function(first, second, kf, kr)
+    return bound_function
+
+
+def _compile_generated_function(lines: List[str],
+                                name: str,
+                                cache: Union["OrderedDict[str, Any]", None] = None,
+                                decorator: Any = njit,
+                                names: Union[Dict[str, Any], None] = None):
+    """Execute the generated source and apply `decorator` (numba's `njit` by default, if installed) to the function `name` it defines.
+    When a `cache` is given, a function previously compiled from the same source is returned instead of compiling it again, and only the \
+    `_MAX_CACHED_FUNCTIONS` most recently used functions are kept. `names` are added to the globals of the generated code."""
+    source = "\n".join(lines)
+    if cache is not None and source in cache:
+        cache.move_to_end(source)
+        return cache[source]
+    # The generated code only needs NumPy, so no builtins are exposed to it
+    namespace: Dict[str, Any] = {"__builtins__": {}, "np": np, **(names or {})}
+    exec(source, namespace)
+    function = namespace[name] if decorator is None else decorator(namespace[name])
+    if cache is not None:
+        cache[source] = function
+        while len(cache) > _MAX_CACHED_FUNCTIONS:
+            cache.popitem(last=False)
+    return function
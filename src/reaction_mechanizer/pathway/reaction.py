@@ -1,9 +1,25 @@
 """Contains tools to model a single step or a whole mechanism for a reaction.
 """
+from collections import Counter
+from functools import lru_cache
 from types import LambdaType
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Tuple, Union
+import ast
 import re
+import sys
 import typing
+import numpy as np
+from scipy.sparse import csr_matrix
+
+_KWARG_PATTERN = re.compile(r"""kwargs\[["']([^"']*)["']\]""")
+# A component of a side: an optional integer or fractional coefficient followed by the species (up to the next "+")
+_COMPONENT_PATTERN = re.compile(r"(?:^|\+)([0-9]+/[0-9]+|[0-9]+)?([^+]*)")
+# Number of species from which the net stoichiometry is applied as a sparse matrix (each step only involves a handful of them)
+_MIN_SPARSE_SPECIES = 32
+# Characters that would let a species name end its string literal in a model string (ie kwargs["A"])
+_INVALID_SPECIES_PATTERN = re.compile(r"""["'\\\n\r]""")
+# Whitespace removed from a step before parsing it
+_WHITESPACE_TABLE = str.maketrans("", "", " \t")
 
 
 class SimpleStep:
@@ -15,10 +31,18 @@ class SimpleStep:
         Args:
             reactants (Dict[str, float]): List of reactants in the following form: {"A":a,"B":b}. To represent fractional coefficients, `a` and `b` are floats
             products (Dict[str, float]): List of products in the following form: {"A":a,"B":b}. To represent fractional coefficients, `a` and `b` are floats
+
+        Raises:
+            ValueError: If a species name contains a quote, a backslash or a line break, which model strings can't hold
         """
+        for thing in (*reactants.keys(), *products.keys()):
+            if _INVALID_SPECIES_PATTERN.search(thing):
+                raise ValueError(f"Invalid species name {thing!r}: it can't contain quotes, backslashes or line breaks")
         self.liquid_solid_reactants: Dict[str, float] = {}
         self.reactants: Dict[str, float] = {}
         for thing, coef in reactants.items():
+            # Species names are compared and hashed across every step, so equal names share one string
+            thing = sys.intern(thing)
             if "(l)" in thing or "(s)" in thing:
                 self.liquid_solid_reactants[thing] = coef
             else:
@@ -30,6 +54,7 @@ class SimpleStep:
         self.liquid_solid_products: Dict[str, float] = {}
 
         for thing, coef in products.items():
+            thing = sys.intern(thing)
             if "(l)" in thing or "(s)" in thing:
                 self.liquid_solid_products[thing] = coef
             else:
@@ -40,9 +65,35 @@ class SimpleStep:
 
         self.kf: float = 0
         self.kr: float = 0
+        # Last products of the reactant and product concentrations (raised to their orders), along with the composition they were built from
+        self._multiplication_cache: Union[Tuple[Tuple[Any, ...], Tuple[str, str]], None] = None
+        # Last result of `get_differential_equations`, along with the rate constants and composition it was built from
+        self._ode_cache: Union[Tuple[Tuple[Any, ...], Dict[str, 'DifferentialEquationModel']], None] = None
+
+    def _get_fingerprint(self) -> Tuple[Any, ...]:
+        """Get the rate constants and composition of this step, which its cached results are valid for. `reactants` and `products` \
+            are public dictionaries, so they may have changed since the step was created.
+
+        Returns:
+            Tuple[Any, ...]: `kf`, `kr`, and the species and coefficients of the reactants and products
+        """
+        return (self.kf, self.kr, tuple(self.reactants.items()), tuple(self.products.items()))
+
+    def _get_multiplications(self) -> Tuple[str, str]:
+        """Get the products of the reactant and of the product concentrations raised to their orders, shared by every model built \
+            from this step.
+
+        Returns:
+            Tuple[str, str]: The reactant and product multiplications ("" if there is no species on that side)
+        """
+        composition = self._get_fingerprint()[2:]
+        if self._multiplication_cache is None or self._multiplication_cache[0] != composition:
+            self._multiplication_cache = (composition, ("*".join([_get_power_str(thing, coef) for thing, coef in self.reactants.items()]),
+                                                        "*".join([_get_power_str(thing, coef) for thing, coef in self.products.items()])))
+        return self._multiplication_cache[1]
 
     @staticmethod
-    def str_to_step(str_step: str, _optional_flag: Any = None) -> 'SimpleStep':
+    def str_to_step(str_step: str) -> 'SimpleStep':
         """Turns a string representation of a reaction to a `SimpleStep` representation of that reaction.
 
         Args:
@@ -50,33 +101,16 @@ class SimpleStep:
                 The string representation of the reaction of the form: "aA + bB -> cC + dD". `a`, `b`, `c`, and `d` are coefficents \
                     (if one is fractional, use fraction notation rather than decimal notation ["1/2" GOOD, "0.5" BAD]). \
                         "->" separates reactants and products, and "A", "B", "C", "D" are names of the species involved in the reaction \
-                            (they shouldn't contain any special characters)
-            _optional_flag (Any, optional): Dummy flag used internally to transfer information during recursive steps.
+                            (they shouldn't contain any special characters). Without "->", the species are taken to be products.
 
         Returns:
             SimpleStep: SimpleStep representation of `str_step`. `self.kf` and `self.kr` are set to 0
         """
+        str_step = str_step.translate(_WHITESPACE_TABLE)
         if "->" in str_step:
-            str_step = str_step.replace("\t", "").replace(" ", "")
             reac_str, prod_str = str_step.split("->")
-            return SimpleStep.str_to_step(reac_str, _optional_flag=True) + SimpleStep.str_to_step(prod_str, _optional_flag=False)
-
-        if "+" in str_step:
-            return typing.cast('SimpleStep', sum([SimpleStep.str_to_step(component, _optional_flag=_optional_flag) for component in str_step.split("+")]))
-
-        match = re.match(r"^[0-9]+\/[0-9]+|^[0-9]+", str_step)
-        cutoff: int = match.span()[1] if match is not None else (1, str_step := "1"+str_step)[0]
-
-        if "/" in str_step:
-            parts: List[str] = str_step[:cutoff].split("/")
-            coef = int(parts[0]) / int(parts[1])
-        else:
-            coef = int(str_step[:cutoff])
-
-        if _optional_flag is True:
-            return SimpleStep({str_step[cutoff:]: coef}, {})
-        else:
-            return SimpleStep({}, {str_step[cutoff:]: coef})
+            return SimpleStep(_parse_side(reac_str), _parse_side(prod_str))
+        return SimpleStep({}, _parse_side(str_step))
 
     def set_rate_constant(self, kf: float = 0, kr: float = 0) -> None:
         """Set the rate constants for `self.kf` and `self.kr`
@@ -95,32 +129,22 @@ class SimpleStep:
             Dict[str, DifferentialEquationModel]:
                 Get dictionary consisting of all the species in this step as keys and all the corresponding differential equation models as values.
         """
-        arguments: str = ",".join(self.reactants.keys())
-        products = [thing for thing in self.products.keys() if thing not in self.reactants.keys()]
-        if len(products) != 0:
-            arguments += ","+",".join(products)
-        reactant_multiplication: str = "*".join([f"""kwargs["{thing}"]**{coef}""" for thing, coef in self.reactants.items()])
-        product_multiplication: str = "*".join([f"""kwargs["{thing}"]**{coef}""" for thing, coef in self.products.items()])
-
-        out = {}
-        out_raw_str = {}
-        out_ode = {}
+        fingerprint = self._get_fingerprint()
+        if self._ode_cache is not None and self._ode_cache[0] == fingerprint:
+            return _copy_models(self._ode_cache[1])
+        reactant_multiplication, product_multiplication = self._get_multiplications()
 
+        out_ode: Dict[str, DifferentialEquationModel] = {}
         for thing, coef in self.reactants.items():
-            out_raw_str[thing] = f"lambda **kwargs: -{coef}*{self.kf}*{reactant_multiplication} + {coef}*{self.kr}*{product_multiplication}"
-            out_ode[thing] = DifferentialEquationModel(f"-{coef}*{self.kf}*{reactant_multiplication} + {coef}*{self.kr}*{product_multiplication}")
+            out_ode[thing] = DifferentialEquationModel(_get_mass_action_str(-coef*self.kf, reactant_multiplication, coef*self.kr, product_multiplication))
         for thing, coef in self.products.items():
-            if thing in out_raw_str:
-                new_lambda_str = f'lambda **kwargs: {coef}*{self.kf}*{reactant_multiplication} - {self.kr}*{coef}*{product_multiplication}'
-                out_raw_str[thing] = f"lambda **kwargs: ({out_raw_str[thing]})(**kwargs) + ({new_lambda_str})(**kwargs)"
-                new_ode = DifferentialEquationModel(f"{coef}*{self.kf}*{reactant_multiplication} - {self.kr}*{coef}*{product_multiplication}")
+            new_ode = DifferentialEquationModel(_get_mass_action_str(coef*self.kf, reactant_multiplication, -coef*self.kr, product_multiplication))
+            if thing in out_ode:
                 out_ode[thing] = DifferentialEquationModel.sum_differential_equations([out_ode[thing], new_ode])
             else:
-                out_raw_str[thing] = f"lambda **kwargs: {coef}*{self.kf}*{reactant_multiplication} - {self.kr}*{coef}*{product_multiplication}"
-                out_ode[thing] = DifferentialEquationModel(f"{coef}*{self.kf}*{reactant_multiplication} - {self.kr}*{coef}*{product_multiplication}")
-        for thing, raw_func in out_raw_str.items():
-            out[thing] = (eval(raw_func), raw_func)
-        return out_ode
+                out_ode[thing] = new_ode
+        self._ode_cache = (fingerprint, out_ode)
+        return _copy_models(out_ode)
 
     def get_differential_equation_of(self, species: str) -> 'DifferentialEquationModel':
         """Get a differential equation for just a single `species` in this step.
@@ -131,23 +155,49 @@ class SimpleStep:
         Returns:
             DifferentialEquationModel: The differential equation model of the `species`
         """
-        arguments: str = ",".join(self.reactants.keys())
-        products = [species for species in self.products.keys() if species not in self.reactants.keys()]
-        if len(products) != 0:
-            arguments += ","+",".join(products)
-        reactant_multiplication: str = "*".join([f"""kwargs["{species}"]**{coef}""" for species, coef in self.reactants.items()])
-        product_multiplication: str = "*".join([f"""kwargs["{species}"]**{coef}""" for species, coef in self.products.items()])
-
-        ode = DifferentialEquationModel("")
+        reactant_multiplication, product_multiplication = self._get_multiplications()
+        # A species can be on both sides, and is left with an empty model if it is on neither
+        terms: List[str] = []
         if species in self.reactants:
-            coef_reactant = self.reactants[species]
-            ode = DifferentialEquationModel.sum_differential_equations(
-                [ode, DifferentialEquationModel(f"-{coef_reactant}*{self.kf}*{reactant_multiplication} + {coef_reactant}*{self.kr}*{product_multiplication}")])
+            coef = self.reactants[species]
+            terms.append(_get_mass_action_str(-coef*self.kf, reactant_multiplication, coef*self.kr, product_multiplication))
         if species in self.products:
-            coef_product = self.products[species]
-            new_ode = DifferentialEquationModel(f'{coef_product}*{self.kf}*{reactant_multiplication} - {self.kr}*{coef_product}*{product_multiplication}')
-            ode = DifferentialEquationModel.sum_differential_equations([ode, new_ode])
-        return ode
+            coef = self.products[species]
+            terms.append(_get_mass_action_str(coef*self.kf, reactant_multiplication, -coef*self.kr, product_multiplication))
+        return DifferentialEquationModel("+".join(terms))
+
+    def get_rate(self) -> 'DifferentialEquationModel':
+        """Get the net rate of this step (forward rate minus reverse rate). The rate of change of any species is its net coefficient \
+            (product coefficient minus reactant coefficient) times this rate.
+
+        Returns:
+            DifferentialEquationModel: The net rate of this step
+        """
+        reactant_multiplication, product_multiplication = self._get_multiplications()
+        return DifferentialEquationModel(_get_mass_action_str(self.kf, reactant_multiplication, -self.kr, product_multiplication))
+
+    def get_jacobian(self) -> Dict[str, Dict[str, 'DifferentialEquationModel']]:
+        """Get the analytic Jacobian of the system of differential equations for this step.
+
+        Returns:
+            Dict[str, Dict[str, DifferentialEquationModel]]:
+                Nested dictionary where `jacobian["A"]["B"]` is the partial derivative of the rate of change of "A" with respect to "B". \
+                    Entries that are identically zero are omitted.
+        """
+        jacobian: Dict[str, Dict[str, DifferentialEquationModel]] = {}
+        for thing in {**self.reactants, **self.products}.keys():
+            coef = self.products.get(thing, 0) - self.reactants.get(thing, 0)
+            if coef == 0:
+                continue
+            row: Dict[str, List[str]] = {}
+            # The net coefficient is folded into the constant of each partial derivative
+            for wrt, partial in _get_mass_action_partials(coef*self.kf, self.reactants).items():
+                row.setdefault(wrt, []).append(partial)
+            for wrt, partial in _get_mass_action_partials(-coef*self.kr, self.products).items():
+                row.setdefault(wrt, []).append(partial)
+            if len(row) != 0:
+                jacobian[thing] = {wrt: DifferentialEquationModel("+".join(terms)) for wrt, terms in row.items()}
+        return jacobian
 
     def set_rate_constant_from_K(self, K: float, normalizing_kr=1) -> None:
         """Set reaction rate using K-value normalized to a certain kr (default is 1). K is mathematically equivalent to kf/kr
@@ -160,8 +210,13 @@ class SimpleStep:
         self.kf = self.kr * K
 
     def __add__(self, other: 'SimpleStep') -> 'SimpleStep':
-        def dict_addition(dict_from, add_to): return {**dict_from, **{thing: dict_from.get(thing, 0)+add_to[thing] for thing in add_to.keys()}}
-        return SimpleStep(dict_addition(self.reactants, other.reactants), dict_addition(self.products, other.products))
+        # Liquids and solids don't take part in the rates, but are still part of the step
+        reactants = Counter({**self.reactants, **self.liquid_solid_reactants})
+        products = Counter({**self.products, **self.liquid_solid_products})
+        # Unlike `Counter.__add__`, `update` keeps every coefficient (and the order of first appearance)
+        reactants.update({**other.reactants, **other.liquid_solid_reactants})
+        products.update({**other.products, **other.liquid_solid_products})
+        return SimpleStep(dict(reactants), dict(products))
 
     def __radd__(self, other: Union['SimpleStep', int]) -> 'SimpleStep':
         if type(other) is int:
@@ -207,6 +262,16 @@ class ReactionMechanism:
             steps (List[SimpleStep]): list of simple steps to conjoin into a `ReactionMechanism`
         """
         self.steps = steps
+        # Last result of `get_differential_equations`, along with the steps and rate constants it was built from
+        self._ode_cache: Union[Tuple[Tuple[Any, ...], Dict[str, 'DifferentialEquationModel']], None] = None
+        # Results of `compile_rhs` and `compile_jacobian` by method and species order, along with the steps and rate constants they were built from
+        self._compiled_cache: Dict[Tuple[str, Tuple[str, ...]], Tuple[Tuple[Any, ...], Callable[[float, Any], Any]]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The compiled functions are local closures, which can't be pickled (ie to send the mechanism to worker processes); they are rebuilt on demand
+        state = dict(self.__dict__)
+        state["_compiled_cache"] = {}
+        return state
 
     @staticmethod
     def str_to_mechanism(str_mechanism: str) -> 'ReactionMechanism':
@@ -230,12 +295,23 @@ class ReactionMechanism:
         for new_rate, step in zip(rates, self.steps):
             step.set_rate_constant(**new_rate)
 
+    def _get_fingerprint(self) -> Tuple[Any, ...]:
+        """Get the steps and their rate constants and compositions, which the cached results of this mechanism are valid for.
+
+        Returns:
+            Tuple[Any, ...]: The steps along with their fingerprints (see `SimpleStep._get_fingerprint`)
+        """
+        return tuple((step, *step._get_fingerprint()) for step in self.steps)
+
     def get_differential_equations(self) -> Dict[str, 'DifferentialEquationModel']:
         """Get the set of `DifferentialEquationModel` representation of this mechanism
 
         Returns:
             Dict[str, DifferentialEquationModel]: Dictionary whose entries represent the differential equation model of each of the species in the mechanism.
         """
+        fingerprint = self._get_fingerprint()
+        if self._ode_cache is not None and self._ode_cache[0] == fingerprint:
+            return _copy_models(self._ode_cache[1])
         out_ode_prev: Dict[str, List['DifferentialEquationModel']] = {}
         out_ode: Dict[str, 'DifferentialEquationModel'] = {}
         for step in self.steps:
@@ -247,17 +323,171 @@ class ReactionMechanism:
 
         for key in out_ode_prev.keys():
             out_ode[key] = DifferentialEquationModel.sum_differential_equations(out_ode_prev[key])
-        return out_ode
+        self._ode_cache = (fingerprint, out_ode)
+        return _copy_models(out_ode)
 
-    def get_intermediates(self):
-        epsilon = 0.0001
-        net_species: Dict[str, float] = {}
+    def get_rates(self) -> List['DifferentialEquationModel']:
+        """Get the net rate (see `SimpleStep.get_rate`) of every step in this mechanism.
+
+        Returns:
+            List[DifferentialEquationModel]: The net rates, in the order of `self.steps`
+        """
+        return [step.get_rate() for step in self.steps]
+
+    def get_stoichiometry(self) -> Dict[str, Dict[int, float]]:
+        """Get the net coefficient of every species in every step, such that the rate of change of a species is the sum of its net \
+            coefficients times the rates from `get_rates`.
+
+        Returns:
+            Dict[str, Dict[int, float]]: Dictionary with the species as keys and dictionaries from step index to net coefficient as values. \
+                Coefficients of 0 are omitted.
+        """
+        stoichiometry: Dict[str, Dict[int, float]] = {}
+        for i, step in enumerate(self.steps):
+            for thing in {**step.reactants, **step.products}.keys():
+                coef = step.products.get(thing, 0) - step.reactants.get(thing, 0)
+                if coef != 0:
+                    stoichiometry.setdefault(thing, {})[i] = coef
+        return stoichiometry
+
+    def get_stoichiometry_matrices(self, species_order: List[str]) -> Tuple[Any, Any, Any, Any, Any]:
+        """Get the mechanism as arrays, with one row per step and one column per species (in the order of `species_order`), such that \
+            the rates are `kf*prod(y**reactant_orders, axis=1) - kr*prod(y**product_orders, axis=1)` and the rates of change are `rates @ net`.
+
+        Args:
+            species_order (List[str]): The species in the order of the columns. It must contain every species in the mechanism.
+
+        Returns:
+            Tuple[Any, Any, Any, Any, Any]: The reactant orders, the product orders, the net stoichiometry (products minus reactants), \
+                and the forward and reverse rate constants of each step
+        """
+        index = {thing: i for i, thing in enumerate(species_order)}
+        reactant_orders = np.zeros((len(self.steps), len(species_order)))
+        product_orders = np.zeros((len(self.steps), len(species_order)))
+        for j, step in enumerate(self.steps):
+            for thing, coef in step.reactants.items():
+                reactant_orders[j, index[thing]] = coef
+            for thing, coef in step.products.items():
+                product_orders[j, index[thing]] = coef
+        kf = np.array([step.kf for step in self.steps], dtype=float)
+        kr = np.array([step.kr for step in self.steps], dtype=float)
+        return reactant_orders, product_orders, product_orders - reactant_orders, kf, kr
+
+    def compile_rhs(self, species_order: List[str]) -> Callable[[float, Any], Any]:
+        """Get the right-hand side of the system of differential equations for this mechanism as a single NumPy function, which computes \
+            the rate of every step at once and combines them with the net stoichiometry (see `get_stoichiometry_matrices`).
+
+        Args:
+            species_order (List[str]): The species in the order of the state vector. It must contain every species in the mechanism.
+
+        Returns:
+            Callable[[float, Any], Any]: Function of `(t, y)` (like `scipy.integrate.solve_ivp` expects) returning the rates of change of `y`. \
+                `y` may also be a 2D array holding one state per column. The rate constants are the ones at the time of the call to `compile_rhs`, \
+                    and the same function is returned until they (or the steps) change.
+        """
+        fingerprint = self._get_fingerprint()
+        cached = self._compiled_cache.get(("compile_rhs", tuple(species_order)))
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        reactant_orders, product_orders, net, kf, kr = self.get_stoichiometry_matrices(species_order)
+        # Each step only gathers the species it involves, rather than raising every species to an order that is mostly 0
+        reactant_index, reactant_exponents = _get_padded_orders(reactant_orders)
+        product_index, product_exponents = _get_padded_orders(product_orders)
+        net_transpose = _get_net_transpose(net)
+
+        def rhs(t, y):
+            return net_transpose @ _get_padded_mass_action_rates(y, reactant_index, reactant_exponents, product_index, product_exponents, kf, kr)
+        self._compiled_cache[("compile_rhs", tuple(species_order))] = (fingerprint, rhs)
+        return rhs
+
+    def compile_jacobian(self, species_order: List[str]) -> Callable[[float, Any], Any]:
+        """Get the analytic Jacobian of `compile_rhs` as a single NumPy function (like the `jac` option of implicit `scipy.integrate.solve_ivp` \
+            methods expects). The partial derivative of a step's forward rate with respect to species `k` is \
+                `kf*R[k]*y[k]**(R[k] - 1)*prod(y[l]**R[l] for l != k)` (and likewise for its reverse rate).
+
+        Args:
+            species_order (List[str]): The species in the order of the state vector. It must contain every species in the mechanism.
+
+        Returns:
+            Callable[[float, Any], Any]: Function of `(t, y)` returning the dense Jacobian matrix, where entry `[i, k]` is the partial derivative \
+                of the rate of change of species `i` with respect to species `k`. The rate constants are the ones at the time of the call to \
+                    `compile_jacobian`, and the same function is returned until they (or the steps) change.
+        """
+        fingerprint = self._get_fingerprint()
+        cached = self._compiled_cache.get(("compile_jacobian", tuple(species_order)))
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        reactant_orders, product_orders, net, kf, kr = self.get_stoichiometry_matrices(species_order)
+        reactant_index, reactant_exponents = _get_padded_orders(reactant_orders)
+        product_index, product_exponents = _get_padded_orders(product_orders)
+        net_transpose = _get_net_transpose(net)
+
+        def jacobian(t, y):
+            y = np.asarray(y, dtype=np.float64)
+            rate_partials = _get_mass_action_rate_partials(y, reactant_index, reactant_exponents, kf) \
+                - _get_mass_action_rate_partials(y, product_index, product_exponents, kr)
+            return net_transpose @ rate_partials
+        self._compiled_cache[("compile_jacobian", tuple(species_order))] = (fingerprint, jacobian)
+        return jacobian
+
+    def get_jacobian(self) -> Dict[str, Dict[str, 'DifferentialEquationModel']]:
+        """Get the analytic Jacobian of the system of differential equations for this mechanism.
+
+        Returns:
+            Dict[str, Dict[str, DifferentialEquationModel]]:
+                Nested dictionary where `jacobian["A"]["B"]` is the partial derivative of the rate of change of "A" with respect to "B". \
+                    Entries that are identically zero are omitted.
+        """
+        jacobian_prev: Dict[str, Dict[str, List['DifferentialEquationModel']]] = {}
         for step in self.steps:
-            for spec, coef in step.reactants.items():
-                net_species[spec] = net_species.get(spec, 0) + coef
-            for spec, coef in step.products.items():
-                net_species[spec] = net_species.get(spec, 0) - coef
-        return [spec for spec, number in net_species.items() if abs(number) < epsilon]
+            for thing, row in step.get_jacobian().items():
+                for wrt, ode in row.items():
+                    jacobian_prev.setdefault(thing, {}).setdefault(wrt, []).append(ode)
+        return {thing: {wrt: DifferentialEquationModel.sum_differential_equations(odes) for wrt, odes in row.items()}
+                for thing, row in jacobian_prev.items()}
+
+    def get_quasi_steady_state(self, species: str) -> 'DifferentialEquationModel':
+        """Get the concentration of `species` under the quasi-steady-state approximation (its rate of change is taken to be 0).
+
+        Args:
+            species (str): The species to get the quasi-steady-state concentration of. Every rate it takes part in must be first order in it.
+
+        Raises:
+            ReactionMechanism.MechanismException: If `species` isn't consumed, or takes part in a rate that isn't first order in it.
+
+        Returns:
+            DifferentialEquationModel: The concentration of `species` in terms of the other species
+        """
+        # d[species]/dt = production + [species]*consumption
+        production: List[str] = []
+        consumption: List[str] = []
+        for step in self.steps:
+            coef = step.products.get(species, 0) - step.reactants.get(species, 0)
+            if coef == 0:
+                continue
+            for k, sign, participants in ((step.kf, 1, step.reactants), (step.kr, -1, step.products)):
+                term = "*".join([f"{sign * coef}*{k}", *[_get_power_str(thing, exponent) for thing, exponent in participants.items() if thing != species]])
+                order = participants.get(species, 0)
+                if order == 0:
+                    production.append(term)
+                elif order == 1:
+                    consumption.append(term)
+                else:
+                    raise ReactionMechanism.MechanismException(f"\"{species}\" takes part in a rate of order {order} in it")
+        if len(consumption) == 0:
+            raise ReactionMechanism.MechanismException(f"\"{species}\" is never consumed, so it has no steady state")
+        return DifferentialEquationModel(f"-({'+'.join(production) or '0'})/({'+'.join(consumption)})")
+
+    def get_intermediates(self) -> List[str]:
+        """Get the species that are produced and consumed in equal amounts over the steps of this mechanism (ie their net coefficient is 0).
+
+        Returns:
+            List[str]: The intermediate species, in order of first appearance
+        """
+        epsilon = 0.0001
+        species = list(dict.fromkeys(thing for step in self.steps for thing in (*step.reactants.keys(), *step.products.keys())))
+        _, _, net, _, _ = self.get_stoichiometry_matrices(species)
+        return [species[i] for i in np.flatnonzero(np.abs(net.sum(axis=0)) < epsilon)]
 
     def __str__(self) -> str:
         return "\n".join([str(step) for step in self.steps])
@@ -279,14 +509,84 @@ class DifferentialEquationModel:
             model_str (str): Should involve all the variables using "kwargs['var']".
         """
         self.model_str = model_str
+        # Last result of `get_lambda`, along with the model string it was evaluated from
+        self._lambda: Union[Tuple[str, LambdaType], None] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Lambdas can't be pickled (ie to send an `ode_override` to worker processes); it is evaluated again on demand
+        state = dict(self.__dict__)
+        state["_lambda"] = None
+        return state
+
+    @staticmethod
+    def from_arrays(species_order: List[str], coef: Any, kf: Any, kr: Any, reactant_orders: Any, product_orders: Any) -> 'DifferentialEquationModel':
+        """Create the differential equation `sum(coef*(kf*prod(y**reactant_orders) - kr*prod(y**product_orders)))` over the steps, \
+            like a column of the net stoichiometry from `ReactionMechanism.get_stoichiometry_matrices` along with the other matrices.
+
+        Args:
+            species_order (List[str]): The species in the order of the columns of `reactant_orders` and `product_orders`
+            coef (Any): The coefficient of each step's rate
+            kf (Any): The forward rate constant of each step
+            kr (Any): The reverse rate constant of each step
+            reactant_orders (Any): Matrix with the order of each species (column) in the forward rate of each step (row)
+            product_orders (Any): Matrix with the order of each species (column) in the reverse rate of each step (row)
+
+        Returns:
+            DifferentialEquationModel: The resultant differential equation. Steps with a coefficient of 0 are left out.
+        """
+        def multiplication(orders):
+            return "*".join(_get_power_str(species_order[i], order) for i, order in enumerate(orders) if order != 0) or "1"
+
+        terms = [f"{c}*({k_forward}*{multiplication(reactant)} - {k_reverse}*{multiplication(product)})"
+                 for c, k_forward, k_reverse, reactant, product in zip(coef, kf, kr, reactant_orders, product_orders) if c != 0]
+        return DifferentialEquationModel("+".join(terms))
 
     def get_lambda(self) -> LambdaType:
-        """Get the lambda version of this `DifferentialEquationModel`. Use keyword arguments to specify variable values.
+        """Get the lambda version of this `DifferentialEquationModel`. Use keyword arguments to specify variable values. \
+            Every call builds a dictionary of them, so prefer `get_lambda_positional` when evaluating it repeatedly.
 
         Returns:
             LambdaType: Lambda version of this `DifferentialEquationModel`
         """
-        return typing.cast(LambdaType, eval(f"lambda **kwargs: {self.model_str}"))
+        if self._lambda is None or self._lambda[0] != self.model_str:
+            self._lambda = (self.model_str, _compile_lambda(f"lambda **kwargs: {self.model_str}"))
+        return self._lambda[1]
+
+    def get_positional_str(self, state_order: List[str], variable_format: str = "cur_state[{}]") -> str:
+        """Get the model string with every "kwargs['var']" replaced by a positional reference into the state vector.
+
+        Args:
+            state_order (List[str]): The species in the order they appear in the state vector
+            variable_format (str, optional): Format string receiving the index of a species. Defaults to "cur_state[{}]".
+
+        Returns:
+            str: The positional model string ("0" if the model is empty)
+        """
+        index = {thing: i for i, thing in enumerate(state_order)}
+        return _KWARG_PATTERN.sub(lambda match: variable_format.format(index[match.group(1)]), self.model_str) or "0"
+
+    def get_lambda_positional(self, state_order: List[str]) -> LambdaType:
+        """Get the lambda version of this `DifferentialEquationModel` taking the whole state vector as its only argument.
+
+        Args:
+            state_order (List[str]): The species in the order they appear in the state vector
+
+        Returns:
+            LambdaType: Lambda taking a sequence of concentrations ordered like `state_order`
+        """
+        return _compile_lambda(f"lambda cur_state: {self.get_positional_str(state_order)}")
+
+    def substitute(self, species: str, model: 'DifferentialEquationModel') -> 'DifferentialEquationModel':
+        """Replace every occurrence of `species` in this model by another model.
+
+        Args:
+            species (str): The species to replace
+            model (DifferentialEquationModel): The model to put in place of `species`
+
+        Returns:
+            DifferentialEquationModel: The resultant differential equation
+        """
+        return DifferentialEquationModel(self.model_str.replace(f"""kwargs["{species}"]""", f"({model.model_str})"))
 
     @staticmethod
     def sum_differential_equations(list_ode: List['DifferentialEquationModel']) -> 'DifferentialEquationModel':
@@ -298,4 +598,209 @@ class DifferentialEquationModel:
         Returns:
             DifferentialEquationModel: The resultant differential equation
         """
-        return DifferentialEquationModel('+'.join([ode.model_str for ode in list_ode]))
+        # Empty models (ie from `from_arrays` with no contributing step) are 0, and would otherwise leave a dangling "+"
+        return DifferentialEquationModel('+'.join([ode.model_str for ode in list_ode if ode.model_str]))
+
+
+def _copy_models(models: Dict[str, 'DifferentialEquationModel']) -> Dict[str, 'DifferentialEquationModel']:
+    """Copy cached models before handing them out, as `model_str` is public and changing it must not alter the cache.
+
+    Args:
+        models (Dict[str, DifferentialEquationModel]): The cached models
+
+    Returns:
+        Dict[str, DifferentialEquationModel]: New models with the same model strings
+    """
+    return {thing: DifferentialEquationModel(model.model_str) for thing, model in models.items()}
+
+
+def _parse_side(str_side: str) -> Dict[str, float]:
+    """Parse one side of a step (ie "2A+1/2B") into a dictionary of species and their coefficients, in a single pass over the string.
+
+    Args:
+        str_side (str): The side of the step, without whitespace
+
+    Returns:
+        Dict[str, float]: The species (in order of first appearance) and their summed coefficients. A missing coefficient counts as 1.
+    """
+    species: Dict[str, float] = {}
+    for match in _COMPONENT_PATTERN.finditer(str_side):
+        coef_str, thing = match.groups()
+        coef: float = 1
+        if coef_str is not None:
+            if "/" in coef_str:
+                numerator, denominator = coef_str.split("/")
+                coef = int(numerator) / int(denominator)
+            else:
+                coef = int(coef_str)
+        species[thing] = species.get(thing, 0) + coef
+    return species
+
+
+@lru_cache(maxsize=4096)
+def _compile_lambda(source: str) -> LambdaType:
+    """Evaluate the source of a lambda, reusing the result for identical sources (even across `DifferentialEquationModel` instances). \
+        The rate constants are part of the source, so changing them can never return a stale lambda.
+
+    Args:
+        source (str): Source of the lambda
+
+    Raises:
+        ValueError: If the source doesn't parse, or the body of the lambda calls anything or accesses an attribute \
+            (ie a species name broke out of its string literal)
+
+    Returns:
+        LambdaType: The evaluated lambda
+    """
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as error:
+        raise ValueError(f"\"{source}\" is not an arithmetic expression of the species") from error
+    # Model strings are pure arithmetic, so no builtins are exposed to the (user supplied) species names
+    if any(isinstance(node, (ast.Call, ast.Attribute)) for node in ast.walk(tree)):
+        raise ValueError(f"\"{source}\" is not an arithmetic expression of the species")
+    return typing.cast(LambdaType, eval(compile(tree, "<model>", "eval"), {"__builtins__": {}}))
+
+
+def _get_padded_mass_action_rates(y: Any, reactant_index: Any, reactant_exponents: Any, product_index: Any, product_exponents: Any,
+                                  kf: Any, kr: Any) -> Any:
+    """Get the net rate of every step from the padded orders of `_get_padded_orders`, so that each step only gathers the species it involves \
+        rather than raising every species to an order that is mostly 0.
+
+    Args:
+        y (Any): The concentrations of the species, or a 2D array holding them for one state per column
+        reactant_index (Any): The padded species indices of the reactants
+        reactant_exponents (Any): The padded reactant orders
+        product_index (Any): The padded species indices of the products
+        product_exponents (Any): The padded product orders
+        kf (Any): The forward rate constants
+        kr (Any): The reverse rate constants
+
+    Returns:
+        Any: The rates of the steps (with one column per state if `y` is 2D)
+    """
+    y = np.asarray(y)
+    # Trailing axes broadcast over the states of a 2D `y`
+    batch_shape = (1,) * (y.ndim - 1)
+    forward = np.prod(y[reactant_index] ** reactant_exponents.reshape(reactant_exponents.shape + batch_shape), axis=1)
+    reverse = np.prod(y[product_index] ** product_exponents.reshape(product_exponents.shape + batch_shape), axis=1)
+    return kf.reshape(kf.shape + batch_shape) * forward - kr.reshape(kr.shape + batch_shape) * reverse
+
+
+def _get_net_transpose(net: Any) -> Any:
+    """Get the transpose of the net stoichiometry of `ReactionMechanism.get_stoichiometry_matrices`, which maps the rates of the steps \
+        to the rates of change of the species. It is sparse for mechanisms with at least `_MIN_SPARSE_SPECIES` species.
+
+    Args:
+        net (Any): The net stoichiometry
+
+    Returns:
+        Any: The transposed net stoichiometry, as a `scipy.sparse.csr_matrix` or a dense array
+    """
+    if net.shape[1] >= _MIN_SPARSE_SPECIES:
+        return csr_matrix(net.T)
+    return np.ascontiguousarray(net.T)
+
+
+def _get_padded_orders(orders: Any) -> Tuple[Any, Any]:
+    """Get the species (and their orders) involved in each step from a matrix of orders of `ReactionMechanism.get_stoichiometry_matrices`, \
+        padded to the same number for every step.
+
+    Args:
+        orders (Any): The reactant or product orders
+
+    Returns:
+        Tuple[Any, Any]: The indices of the species involved in each step (row), and their orders. \
+            Padding uses the first species with an order of 0, so it contributes a factor of 1.
+    """
+    rows, columns = np.nonzero(orders)
+    counts = np.bincount(rows, minlength=orders.shape[0])
+    index = np.zeros((orders.shape[0], max(int(counts.max(initial=0)), 1)), dtype=np.intp)
+    exponents = np.zeros(index.shape)
+    # Position of each nonzero entry within its row
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    index[rows, positions] = columns
+    exponents[rows, positions] = orders[rows, columns]
+    return index, exponents
+
+
+def _get_mass_action_rate_partials(y: Any, index: Any, exponents: Any, k: Any) -> Any:
+    """Get the partial derivatives of the mass action rates `k*prod(y[index]**exponents, axis=1)` of the steps with respect to each species.
+
+    Args:
+        y (Any): The concentrations of the species
+        index (Any): The padded species indices of `_get_padded_orders`
+        exponents (Any): The padded orders of `_get_padded_orders`
+        k (Any): The rate constant of each step
+
+    Returns:
+        Any: Matrix with one row per step and one column per species
+    """
+    concentrations = y[index]
+    # Padding has an order of 0, and its derivative is left at 0 rather than computing 0**-1
+    derivatives = np.zeros(exponents.shape)
+    np.power(concentrations, exponents - 1, out=derivatives, where=exponents != 0)
+    # Product of the factors of the other species of each step, for every species in it
+    others = np.where(np.eye(index.shape[1], dtype=bool), 1.0, (concentrations ** exponents)[:, np.newaxis, :]).prod(axis=2)
+    partials = np.zeros((len(k), len(y)))
+    np.add.at(partials, (np.broadcast_to(np.arange(len(k))[:, np.newaxis], index.shape), index), k[:, np.newaxis] * exponents * derivatives * others)
+    return partials
+
+
+def _get_power_str(species: str, exponent: float) -> str:
+    """Get the model string of the concentration of `species` raised to `exponent`. Small integer exponents are written as repeated \
+        multiplication, and other integral ones as integer powers, which are cheaper to evaluate than a float power.
+
+    Args:
+        species (str): The species
+        exponent (float): The exponent
+
+    Returns:
+        str: The model string
+    """
+    if exponent == 0:
+        return "1"
+    if float(exponent).is_integer():
+        if 1 <= exponent <= 3:
+            return "*".join([f"""kwargs["{species}"]"""] * int(exponent))
+        return f"""kwargs["{species}"]**{int(exponent)}"""
+    return f"""kwargs["{species}"]**{exponent}"""
+
+
+def _get_mass_action_partials(k: float, species: Dict[str, float]) -> Dict[str, str]:
+    """Get the partial derivatives of the mass action rate `k*[A]**a*[B]**b...` with respect to each of the species in it.
+
+    Args:
+        k (float): The rate constant (along with any other constant factor)
+        species (Dict[str, float]): The species in the rate along with their exponents
+
+    Returns:
+        Dict[str, str]: Dictionary with the species as keys and the model strings of the partial derivatives as values. \
+            Nothing is returned if `k` is 0, as every partial derivative is then 0.
+    """
+    partials: Dict[str, str] = {}
+    if k == 0:
+        return partials
+    for wrt, exponent in species.items():
+        factors = [f"{exponent*k}", _get_power_str(wrt, exponent - 1)]
+        factors.extend(_get_power_str(thing, coef) for thing, coef in species.items() if thing != wrt)
+        partials[wrt] = "*".join(factor for factor in factors if factor != "1")
+    return partials
+
+
+def _get_mass_action_str(forward_constant: float, reactant_multiplication: str, reverse_constant: float, product_multiplication: str) -> str:
+    """Get the model string `forward_constant*reactant_multiplication + reverse_constant*product_multiplication`, with each constant \
+        already folded into a single number and the terms whose constant is 0 left out.
+
+    Args:
+        forward_constant (float): The constant factor of the forward term (ie the coefficient times kf)
+        reactant_multiplication (str): The product of the reactant concentrations ("" if there is none)
+        reverse_constant (float): The constant factor of the reverse term (ie minus the coefficient times kr)
+        product_multiplication (str): The product of the product concentrations ("" if there is none)
+
+    Returns:
+        str: The model string ("0" if both constants are 0)
+    """
+    terms = [f"{constant}*{multiplication}" if multiplication else f"{constant}"
+             for constant, multiplication in ((forward_constant, reactant_multiplication), (reverse_constant, product_multiplication)) if constant != 0]
+    return " + ".join(terms) or "0"
@@ -0,0 +1,21 @@
+from typing import Dict, Tuple
+from reaction_mechanizer.pathway.reaction import ReactionMechanism
+import pytest
+
+# Mechanisms (given as strings, so that each test gets its own instance to set the rate constants of) along with their rate constants and
+# a concentration of each species to evaluate them at
+MASS_ACTION_CASES = [
+    ("""S+E->C
+        C->E+P""", [{"kf": 1, "kr": 0.05}, {"kf": 0.2}], {"S": 2, "E": 1, "C": 0.5, "P": 0.1}),
+    ("""2A+1/2B->C
+        C+A->2D""", [{"kf": 0.7, "kr": 0.3}, {"kf": 2, "kr": 1}], {"A": 1.5, "B": 0.8, "C": 0.4, "D": 2})
+]
+
+
+@pytest.fixture(params=MASS_ACTION_CASES)
+def mass_action_case(request) -> Tuple[ReactionMechanism, Dict[str, float]]:
+    """A mechanism with its rate constants set, along with the concentrations to evaluate it at."""
+    mechanism_str, rates, coordinate = request.param
+    mechanism = ReactionMechanism.str_to_mechanism(mechanism_str)
+    mechanism.set_rate_constants(rates)
+    return mechanism, coordinate
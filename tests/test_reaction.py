@@ -1,14 +1,18 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from reaction_mechanizer.pathway.reaction import DifferentialEquationModel, SimpleStep
 from reaction_mechanizer.drawing.mechanism_reaction_visualizer import ReactionMechanism
+import numpy as np
+import pickle
 import pytest
 
 
 @pytest.mark.parametrize("string_input, expected", [
     ("A+B->C+D", SimpleStep({"A": 1, "B": 1}, {"C": 1, "D": 1})),
     ("A +B -> C+      D", SimpleStep({"A": 1, "B": 1}, {"C": 1, "D": 1})),
+    ("A\t+B ->\tC+D", SimpleStep({"A": 1, "B": 1}, {"C": 1, "D": 1})),
     ("1/2A+3B->C+5/6D", SimpleStep({"A": 1/2, "B": 3}, {"C": 1, "D": 5/6})),
-    ("1/2A+ 3B->C+  3/800D", SimpleStep({"A": 1/2, "B": 3}, {"C": 1, "D": 3/800}))
+    ("1/2A+ 3B->C+  3/800D", SimpleStep({"A": 1/2, "B": 3}, {"C": 1, "D": 3/800})),
+    ("A+2B+A->\t2C+1/2B", SimpleStep({"A": 2, "B": 2}, {"C": 2, "B": 1/2}))
 ])
 def test_str_to_step(string_input, expected):
     assert SimpleStep.str_to_step(string_input) == expected
@@ -81,3 +85,205 @@ def test_str_simple_step(simple_step: SimpleStep, expected: str):
 ])
 def test_intermediates(reaction_mechanism: ReactionMechanism, expected_intermediates: List[str]):
     assert set(reaction_mechanism.get_intermediates()) == set(expected_intermediates)
+
+
+@pytest.mark.parametrize("rate_of, state_order, coordinates, input_step", [
+    ("A", ["A", "B", "C", "D"], [[1, 1, 1, 1], [2, 2, 2, 1]], "A+B->C+D"),
+    ("C", ["D", "C", "B", "A"], [[1, 2, 3, 4], [0.5, 0, 2, 1]], "A+2B->C+D")
+])
+def test_differential_equation_positional(rate_of: str, state_order: List[str], coordinates: List[List[float]], input_step: str):
+    step = SimpleStep.str_to_step(input_step)
+    step.set_rate_constant(kf=2, kr=0.5)
+    ode = step.get_differential_equation_of(rate_of)
+    for coord in coordinates:
+        assert ode.get_lambda_positional(state_order)(coord) == ode.get_lambda()(**dict(zip(state_order, coord)))
+
+
+def test_differential_equation_lambda_cache():
+    step = SimpleStep.str_to_step("A+B->C")
+    step.set_rate_constant(kf=2)
+    assert step.get_differential_equation_of("C").get_lambda() is step.get_differential_equation_of("C").get_lambda()
+    step.set_rate_constant(kf=3)
+    assert step.get_differential_equation_of("C").get_lambda()(A=1, B=1, C=0) == 3
+
+
+def test_sum_differential_equations():
+    odes = [DifferentialEquationModel(""), DifferentialEquationModel("""2*kwargs["A"]"""), DifferentialEquationModel("")]
+    assert DifferentialEquationModel.sum_differential_equations(odes).get_lambda()(A=3) == 6
+
+
+def test_lambda_follows_model_str():
+    ode = DifferentialEquationModel("""2*kwargs["A"]""")
+    assert ode.get_lambda() is ode.get_lambda()
+    ode.model_str = """3*kwargs["A"]"""
+    assert ode.get_lambda()(A=1) == 3
+    with pytest.raises(ValueError):
+        DifferentialEquationModel("""abs(kwargs["A"])""").get_lambda()
+    with pytest.raises(ValueError):
+        DifferentialEquationModel("""kwargs["A"].__class__""").get_lambda()
+
+
+def test_pickle_model():
+    ode = DifferentialEquationModel("""2*kwargs["A"]""")
+    ode.get_lambda()
+    unpickled = pickle.loads(pickle.dumps(ode))
+    assert unpickled.model_str == ode.model_str
+    assert unpickled.get_lambda()(A=2) == 4
+
+
+@pytest.mark.parametrize("string_input", [
+    """A"]*print("INJECTED")*kwargs["A->B""",
+    """A'->B""",
+    "A\\->B"
+])
+def test_invalid_species_name(string_input: str):
+    with pytest.raises(ValueError):
+        SimpleStep.str_to_step(string_input)
+
+
+def test_differential_equations_cache():
+    mechanism = ReactionMechanism.str_to_mechanism("""A->B
+                                                   B->C""")
+    mechanism.set_rate_constants([{"kf": 1}, {"kf": 2}])
+    assert mechanism.get_differential_equations()["B"].get_lambda()(A=1, B=1, C=0) == -1
+    mechanism.steps[1].set_rate_constant(kf=3)
+    assert mechanism.get_differential_equations()["B"].get_lambda()(A=1, B=1, C=0) == -2
+    mechanism.steps[0].set_rate_constant_from_K(2)
+    assert mechanism.steps[0].get_differential_equations()["B"].get_lambda()(A=1, B=1, C=0) == 1
+    mechanism.get_differential_equations()["B"].model_str = "0"
+    mechanism.steps[0].get_differential_equations()["B"].model_str = "0"
+    assert mechanism.get_differential_equations()["B"].get_lambda()(A=1, B=1, C=0) == -2
+    assert mechanism.steps[0].get_differential_equations()["B"].get_lambda()(A=1, B=1, C=0) == 1
+    rhs = mechanism.compile_rhs(["A", "B", "C"])
+    assert mechanism.compile_rhs(["A", "B", "C"]) is rhs
+    mechanism.steps[1].set_rate_constant(kf=4)
+    assert mechanism.compile_rhs(["A", "B", "C"])(0, np.array([1, 1, 0]))[1] == -3
+
+
+def test_zero_rate_terms():
+    step = SimpleStep.str_to_step("2A+B->C")
+    step.set_rate_constant(kf=3)
+    odes = step.get_differential_equations()
+    assert odes["A"].model_str == """-6*kwargs["A"]*kwargs["A"]*kwargs["B"]"""
+    assert "kwargs[\"C\"]" not in step.get_rate().model_str
+    assert "C" not in step.get_jacobian()["A"]
+    step.set_rate_constant(kf=0)
+    assert step.get_differential_equation_of("C").get_lambda()(A=1, B=1, C=1) == 0
+
+
+def test_changed_composition():
+    mechanism = ReactionMechanism.str_to_mechanism("""A->B
+                                                   B->C""")
+    mechanism.set_rate_constants([{"kf": 1}, {"kf": 2}])
+    step = mechanism.steps[0]
+    assert step.get_differential_equations()["A"].get_lambda()(A=3, B=0) == -3
+    assert mechanism.get_differential_equations()["A"].get_lambda()(A=3, B=0, C=0) == -3
+    step.reactants["A"] = 2
+    assert step.get_differential_equations()["A"].get_lambda()(A=3, B=0) == -18
+    assert step.get_rate().get_lambda()(A=3, B=0) == 9
+    assert mechanism.get_differential_equations()["A"].get_lambda()(A=3, B=0, C=0) == -18
+
+
+def test_step_without_products():
+    step = SimpleStep({"A": 2}, {})
+    step.set_rate_constant(kf=3, kr=1)
+    assert step.get_differential_equations()["A"].get_lambda()(A=2) == -22
+
+
+def test_jacobian(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    h = 1e-6
+    odes = {thing: ode.get_lambda() for thing, ode in reaction_mechanism.get_differential_equations().items()}
+    jacobian = reaction_mechanism.get_jacobian()
+    for thing, ode in odes.items():
+        for wrt in coordinate.keys():
+            shifted = {**coordinate, wrt: coordinate[wrt] + h}
+            finite_difference = (ode(**shifted) - ode(**coordinate)) / h
+            analytic = jacobian[thing][wrt].get_lambda()(**coordinate) if wrt in jacobian.get(thing, {}) else 0
+            assert abs(finite_difference - analytic) <= 1e-4
+
+
+def test_rates_and_stoichiometry(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    step_rates = [rate.get_lambda()(**coordinate) for rate in reaction_mechanism.get_rates()]
+    stoichiometry = reaction_mechanism.get_stoichiometry()
+    for thing, ode in reaction_mechanism.get_differential_equations().items():
+        expected = ode.get_lambda()(**coordinate)
+        assert abs(sum(coef * step_rates[i] for i, coef in stoichiometry.get(thing, {}).items()) - expected) <= 1e-9
+
+
+def test_stoichiometry_matrices(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    species_order = list(coordinate.keys())
+    reactant_orders, product_orders, net, kf, kr = reaction_mechanism.get_stoichiometry_matrices(species_order)
+    y = np.array(list(coordinate.values()))
+    derivatives = (kf * np.prod(y**reactant_orders, axis=1) - kr * np.prod(y**product_orders, axis=1)) @ net
+    for i, thing in enumerate(species_order):
+        expected = reaction_mechanism.get_differential_equations()[thing].get_lambda()(**coordinate)
+        assert abs(derivatives[i] - expected) <= 1e-9
+        ode = DifferentialEquationModel.from_arrays(species_order, net[:, i], kf, kr, reactant_orders, product_orders)
+        assert abs(ode.get_lambda()(**coordinate) - expected) <= 1e-9
+
+
+def test_compile_rhs(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    species_order = list(coordinate.keys())
+    rhs = reaction_mechanism.compile_rhs(species_order)
+    y = np.array(list(coordinate.values()))
+    derivatives = rhs(0, y)
+    columns = rhs(0, np.column_stack([y, 2 * y]))
+    for i, thing in enumerate(species_order):
+        ode = reaction_mechanism.get_differential_equations()[thing].get_lambda()
+        assert abs(derivatives[i] - ode(**coordinate)) <= 1e-9
+        assert abs(columns[i, 1] - ode(**{key: 2 * value for key, value in coordinate.items()})) <= 1e-9
+
+
+def test_species_names_interned():
+    first, second = SimpleStep.str_to_step("Ab+B->C"), SimpleStep.str_to_step("C->2Ab")
+    assert next(iter(first.reactants)) is next(iter(second.products))
+
+
+def test_add_steps():
+    steps = [SimpleStep.str_to_step("A+B->C"), SimpleStep.str_to_step("1/2A->D"), SimpleStep.str_to_step("C->2D")]
+    assert sum(steps) == SimpleStep({"A": 1.5, "B": 1, "C": 1}, {"C": 1, "D": 3})
+    total = SimpleStep.str_to_step("A->B+H2O(l)") + SimpleStep.str_to_step("B+H2O(l)->C")
+    assert total.liquid_solid_reactants == {"H2O(l)": 1} and total.liquid_solid_products == {"H2O(l)": 1}
+
+
+def test_compile_jacobian(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    species_order = list(coordinate.keys())
+    jacobian = reaction_mechanism.compile_jacobian(species_order)
+    assert reaction_mechanism.compile_jacobian(species_order) is jacobian
+    matrix = jacobian(0, np.array(list(coordinate.values())))
+    expected = reaction_mechanism.get_jacobian()
+    for i, thing in enumerate(species_order):
+        for k, wrt in enumerate(species_order):
+            partial = expected.get(thing, {}).get(wrt)
+            assert abs(matrix[i, k] - (0 if partial is None else partial.get_lambda()(**coordinate))) <= 1e-9
+
+
+def test_pickle_compiled(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    reaction_mechanism, coordinate = mass_action_case
+    species_order = list(coordinate.keys())
+    y = np.array(list(coordinate.values()))
+    expected = reaction_mechanism.compile_rhs(species_order)(0, y)
+    reaction_mechanism.compile_jacobian(species_order)
+    unpickled = pickle.loads(pickle.dumps(reaction_mechanism))
+    assert np.allclose(unpickled.compile_rhs(species_order)(0, y), expected)
+
+
+def test_compile_rhs_sparse():
+    # Enough species for the net stoichiometry to be applied as a sparse matrix
+    number_species = 40
+    mechanism = ReactionMechanism.str_to_mechanism("\n".join(f"A{i}->A{i + 1}" for i in range(number_species - 1)))
+    mechanism.set_rate_constants([{"kf": 1, "kr": 0.5}] * (number_species - 1))
+    species_order = [f"A{i}" for i in range(number_species)]
+    y = np.linspace(1, 2, number_species)
+    derivatives = mechanism.compile_rhs(species_order)(0, y)
+    assert isinstance(derivatives, np.ndarray) and derivatives.shape == (number_species,)
+    assert mechanism.compile_rhs(species_order)(0, np.column_stack([y, y])).shape == (number_species, 2)
+    assert mechanism.compile_jacobian(species_order)(0, y).shape == (number_species, number_species)
+    odes = mechanism.get_differential_equations()
+    coordinate = dict(zip(species_order, y))
+    assert all(abs(derivatives[i] - odes[thing].get_lambda()(**coordinate)) <= 1e-9 for i, thing in enumerate(species_order))
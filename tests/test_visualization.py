@@ -1,7 +1,11 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import pytest
 from reaction_mechanizer.pathway.reaction import ReactionMechanism, SimpleStep
-from reaction_mechanizer.drawing.mechanism_reaction_visualizer import ReactionVisualizer
+from reaction_mechanizer.drawing import mechanism_reaction_visualizer
+from reaction_mechanizer.drawing.mechanism_reaction_visualizer import ReactionEvent, ReactionVisualizer, SimulationResult
+from reaction_mechanizer.drawing.mechanism_reaction_visualizer import _get_jacobian_function, _get_mass_action_jacobian_function, _get_ode_function_body
+from scipy.integrate import solve_ivp
+import numpy as np
 
 epsilon = 0.001
 end_time = 1000
@@ -106,3 +110,290 @@ def test_mechanism_robust(
     vis = ReactionVisualizer(mechanism)
     df = vis.progress_reaction_robust(initial_condition, end_time, method="Radau")
     assert abs(df.iloc[-1][species_of_importance] - expected_concentration) <= epsilon
+
+
+@pytest.mark.parametrize("k_values_list, mechanism, initial_condition", [
+    (
+        [{"kf": 1, "kr": 0.05}, {"kf": 0.2}],
+        ReactionMechanism.str_to_mechanism("""S+E->C
+                                           C->E+P"""),
+        {"S": 2, "E": 1, "C": 0, "P": 0}
+    ),
+    (
+        [{"kf": 1, "kr": 0.5}] * 79,
+        ReactionMechanism.str_to_mechanism("\n".join(f"A{i}->A{i + 1}" for i in range(79))),
+        {f"A{i}": 1.0 if i == 0 else 0.0 for i in range(80)}
+    ),
+])
+def test_numbalsoda_backend(k_values_list: List[Dict[str, float]], mechanism: ReactionMechanism, initial_condition: Dict[str, float]):
+    pytest.importorskip("numbalsoda")
+    mechanism.set_rate_constants(k_values_list)
+    vis = ReactionVisualizer(mechanism)
+    df_scipy = vis.progress_reaction(initial_condition, end_time, granularity)
+    df_numbalsoda = vis.progress_reaction(initial_condition, end_time, granularity, backend="numbalsoda")
+    assert (abs(df_scipy - df_numbalsoda) <= epsilon).all().all()
+
+
+@pytest.mark.parametrize("event, expected_concentration", [
+    ((500, ReactionEvent.CHANGE_CONCENTRATION, ("B", 0.25)), 1.25),
+    ((500, ReactionEvent.SET_CONCENTRATION, ("B", 0.25)), 0.25)
+])
+def test_events(event: tuple, expected_concentration: float):
+    step = SimpleStep.str_to_step("A->B")
+    step.set_rate_constant(kf=1)
+    vis = ReactionVisualizer(step)
+    df = vis.progress_reaction({"A": 1, "B": 0}, end_time, granularity, events=[event])
+    assert abs(df.iloc[-1]["B"] - expected_concentration) <= epsilon
+
+
+@pytest.mark.parametrize("k_values_list, mechanism, initial_condition, override_species", [
+    (
+        [{"kf": 1, "kr": 0.05}, {"kf": 0.2}],
+        ReactionMechanism.str_to_mechanism("""S+E->C
+                                           C->E+P"""),
+        {"S": 2, "E": 1, "C": 0, "P": 0},
+        "P"
+    ),
+])
+def test_ode_override_robust(k_values_list: List[Dict[str, float]], mechanism: ReactionMechanism, initial_condition: Dict[str, float], override_species: str):
+    mechanism.set_rate_constants(k_values_list)
+    vis = ReactionVisualizer(mechanism)
+    ode_override = {override_species: mechanism.get_differential_equations()[override_species]}
+    expected = vis.get_states_robust(initial_condition, end_time, method="Radau")
+    result = vis.get_states_robust(initial_condition, end_time, ode_override=ode_override, method="Radau")
+    assert (abs(expected.y[:, -1] - result.y[:, -1]) <= epsilon).all()
+
+
+@pytest.mark.parametrize("k_values_list, mechanism, initial_condition, eliminated", [
+    (
+        [{"kf": 1}, {"kf": 100}],
+        ReactionMechanism.str_to_mechanism("""A->X
+                                           X->B"""),
+        {"A": 1, "X": 0, "B": 0},
+        ["X"]
+    ),
+    (
+        [{"kf": 1, "kr": 50}, {"kf": 50}, {"kf": 0.5}],
+        ReactionMechanism.str_to_mechanism("""A+B->X
+                                           X->Y
+                                           Y->C"""),
+        {"A": 2, "B": 1, "X": 0, "Y": 0, "C": 0},
+        ["X"]
+    ),
+])
+def test_quasi_steady_state(k_values_list: List[Dict[str, float]], mechanism: ReactionMechanism, initial_condition: Dict[str, float], eliminated: List[str]):
+    mechanism.set_rate_constants(k_values_list)
+    vis = ReactionVisualizer(mechanism)
+    df = vis.progress_reaction(initial_condition, 10, granularity)
+    df_reduced = vis.progress_reaction(initial_condition, 10, granularity, quasi_steady_state=eliminated)
+    assert list(df.columns) == list(df_reduced.columns)
+    assert (abs(df.iloc[len(df)//10:] - df_reduced.iloc[len(df)//10:]) <= 0.02).all().all()
+
+
+@pytest.mark.parametrize("k_values_list, mechanism, initial_conditions", [
+    (
+        [{"kf": 1, "kr": 0.05}, {"kf": 0.2}],
+        ReactionMechanism.str_to_mechanism("""S+E->C
+                                           C->E+P"""),
+        [{"S": 2, "E": 1, "C": 0, "P": 0}, {"S": 1, "E": 0.5, "C": 0.5, "P": 0}]
+    ),
+])
+@pytest.mark.parametrize("prefer", [None, "threads"])
+def test_progress_reactions_batch(k_values_list: List[Dict[str, float]], mechanism: ReactionMechanism, initial_conditions: List[Dict[str, float]],
+                                  prefer: str):
+    mechanism.set_rate_constants(k_values_list)
+    vis = ReactionVisualizer(mechanism)
+    dfs = vis.progress_reactions_batch(initial_conditions, end_time, granularity, n_jobs=2, prefer=prefer)
+    assert len(dfs) == len(initial_conditions)
+    for initial_condition, df in zip(initial_conditions, dfs):
+        assert (abs(df - vis.progress_reaction(initial_condition, end_time, granularity)) <= epsilon).all().all()
+
+
+@pytest.mark.parametrize("event, expected_concentration", [
+    ((500, ReactionEvent.CHANGE_CONCENTRATION, ("B", 0.25)), 1.25),
+    ((500, ReactionEvent.SET_CONCENTRATION, ("B", 0.25)), 0.25)
+])
+def test_events_robust(event: tuple, expected_concentration: float):
+    step = SimpleStep.str_to_step("A->B")
+    step.set_rate_constant(kf=1)
+    vis = ReactionVisualizer(step)
+    df = vis.progress_reaction_robust({"A": 1, "B": 0}, end_time, events=[event], method="Radau")
+    assert abs(df.iloc[-1]["B"] - expected_concentration) <= epsilon
+    assert df["Time"].is_monotonic_increasing
+
+
+@pytest.mark.parametrize("numba_available", [True, False])
+def test_large_mechanism(numba_available: bool, monkeypatch: pytest.MonkeyPatch):
+    if not numba_available:
+        monkeypatch.setattr(mechanism_reaction_visualizer, "njit", None)
+    # Enough steps for the right-hand side to work on the stoichiometry matrices rather than generated code
+    number_species = 80
+    mechanism = ReactionMechanism.str_to_mechanism("\n".join(f"A{i}->A{i + 1}" for i in range(number_species - 1)))
+    mechanism.set_rate_constants([{"kf": 1, "kr": 0.5}] * (number_species - 1))
+    initial_state = {f"A{i}": 1.0 if i == 0 else 0.0 for i in range(number_species)}
+    df = ReactionVisualizer(mechanism).progress_reaction(initial_state, 10, 100)
+    assert abs(df.iloc[-1][list(initial_state.keys())].sum() - 1) <= epsilon
+    df_robust = ReactionVisualizer(mechanism).progress_reaction_robust(initial_state, 10, method="BDF")
+    assert abs(df_robust.iloc[-1]["A1"] - df.iloc[-1]["A1"]) <= epsilon
+    state_order = list(initial_state.keys())
+    expected = solve_ivp(mechanism.compile_rhs(state_order), (0, 10), list(initial_state.values()), method="BDF",
+                         jac=mechanism.compile_jacobian(state_order), rtol=1e-8, atol=1e-10).y[:, -1]
+    assert np.allclose(df.iloc[-1][state_order], expected, atol=epsilon)
+
+
+def test_matches_compiled(mass_action_case: Tuple[ReactionMechanism, Dict[str, float]]):
+    # Both integrators (and the analytic Jacobian given to the implicit methods) agree with `compile_rhs` and `compile_jacobian`
+    mechanism, coordinate = mass_action_case
+    state_order = list(coordinate.keys())
+    expected = solve_ivp(mechanism.compile_rhs(state_order), (0, 2), list(coordinate.values()), method="BDF",
+                         jac=mechanism.compile_jacobian(state_order), rtol=1e-8, atol=1e-10).y[:, -1]
+    vis = ReactionVisualizer(mechanism)
+    assert np.allclose(vis.progress_reaction(coordinate, 2, 3).iloc[-1][state_order], expected, atol=1e-6)
+    df_robust = vis.progress_reaction_robust(coordinate, 2, method="BDF", rtol=1e-8, atol=1e-10)
+    assert np.allclose(df_robust.iloc[-1][state_order], expected, atol=1e-6)
+    # A wrong Jacobian only slows the convergence of the implicit methods rather than changing their results, so it is compared directly
+    y = np.array(list(coordinate.values()))
+    kf, kr = np.array([step.kf for step in mechanism.steps]), np.array([step.kr for step in mechanism.steps])
+    expected_jacobian = mechanism.compile_jacobian(state_order)(0, y)
+    assert np.allclose(_get_jacobian_function(mechanism.steps, mechanism.get_stoichiometry(), state_order)(y, 0, kf, kr), expected_jacobian)
+    assert np.allclose(_get_mass_action_jacobian_function(*mechanism.get_stoichiometry_matrices(state_order))(y, 0), expected_jacobian)
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numbalsoda"])
+def test_events_time_grid(backend: str):
+    if backend == "numbalsoda":
+        pytest.importorskip("numbalsoda")
+    step = SimpleStep.str_to_step("A->B")
+    step.set_rate_constant(kf=1)
+    events = [(3.3, ReactionEvent.CHANGE_CONCENTRATION, ("A", 1)), (0, ReactionEvent.SET_CONCENTRATION, ("B", 1)),
+              (7.77, ReactionEvent.SET_CONCENTRATION, ("A", 0))]
+    df = ReactionVisualizer(step).progress_reaction({"A": 1, "B": 0}, 10, 7, events=events, backend=backend)
+    assert (df["Time"] == np.linspace(0, 10, 7)).all()
+    # Everything but the A left when it is set to 0 ends up as B
+    assert abs(df.iloc[-1]["B"] - (3 - (np.exp(-3.3) + 1) * np.exp(-(7.77 - 3.3)))) <= epsilon
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numbalsoda"])
+def test_events_on_time_grid(backend: str, capfd: pytest.CaptureFixture):
+    if backend == "numbalsoda":
+        pytest.importorskip("numbalsoda")
+    step = SimpleStep.str_to_step("A->B")
+    step.set_rate_constant(kf=1)
+    # Both events fall on rows of the output (up to rounding), so no time should be given to the integrator twice
+    events = [(3.3, ReactionEvent.SET_CONCENTRATION, ("A", 1)), (10, ReactionEvent.SET_CONCENTRATION, ("B", 0))]
+    df = ReactionVisualizer(step).progress_reaction({"A": 1, "B": 0}, 10, 101, events=events, backend=backend)
+    assert abs(df.iloc[-1]["A"] - np.exp(-6.7)) <= epsilon
+    assert abs(df.iloc[-2]["B"] - (2 - np.exp(-3.3) - np.exp(-6.6))) <= epsilon
+    # The row at `time_end` is after the event there
+    assert df.iloc[-1]["B"] == 0
+    assert capfd.readouterr().out == ""
+
+
+@pytest.mark.parametrize("quasi_steady_state", [None, ["C"]])
+def test_simulation_result(quasi_steady_state: List[str]):
+    mechanism = ReactionMechanism.str_to_mechanism("""S+E->C
+                                                   C->E+P""")
+    mechanism.set_rate_constants([{"kf": 1, "kr": 0.05}, {"kf": 0.2}])
+    vis = ReactionVisualizer(mechanism)
+    initial_condition = {"S": 2, "E": 1, "C": 0, "P": 0}
+    result = vis.progress_reaction(initial_condition, 10, 100, quasi_steady_state=quasi_steady_state, return_dataframe=False)
+    assert isinstance(result, SimulationResult)
+    assert result.species == list(initial_condition.keys())
+    assert result.concentrations.shape == (100, 4)
+    df = vis.progress_reaction(initial_condition, 10, 100, quasi_steady_state=quasi_steady_state)
+    assert result.to_frame().equals(df)
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numbalsoda"])
+def test_compile(backend: str):
+    if backend == "numbalsoda":
+        pytest.importorskip("numbalsoda")
+    step = SimpleStep.str_to_step("2A->B")
+    step.set_rate_constant(kf=1, kr=0.5)
+    vis = ReactionVisualizer(step)
+    vis.compile(["A", "B"], backend=backend)
+    df = vis.progress_reaction({"A": 1, "B": 0}, 10, 100, backend=backend)
+    assert df.equals(ReactionVisualizer(step).progress_reaction({"A": 1, "B": 0}, 10, 100, backend=backend))
+    assert abs(df.iloc[-1]["B"] - 2 * df.iloc[-1]["A"]**2) <= epsilon
+    with pytest.raises(ValueError):
+        vis.compile(["A", "B"], backend="unknown")
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numbalsoda"])
+def test_rate_sweep_reuses_compiled(backend: str):
+    if backend == "numbalsoda":
+        pytest.importorskip("numbalsoda")
+    step = SimpleStep.str_to_step("2A->B")
+    vis = ReactionVisualizer(step)
+    number_compiled = None
+    for kf, kr in [(1, 0.5), (2, 0.5), (0.5, 4)]:
+        step.set_rate_constant(kf=kf, kr=kr)
+        df = vis.progress_reaction({"A": 1, "B": 0}, 20, 100, backend=backend)
+        assert abs(df.iloc[-1]["B"] - kf / kr * df.iloc[-1]["A"]**2) <= epsilon
+        if backend == "scipy":
+            vis.progress_reaction_robust({"A": 1, "B": 0}, 20, method="BDF")
+        # The functions compiled for the first rate constants are reused for the others
+        number_compiled = number_compiled or len(vis._ode_cache)
+        assert len(vis._ode_cache) == number_compiled
+
+
+@pytest.mark.parametrize("robust", [False, True])
+def test_event_after_end(robust: bool):
+    step = SimpleStep.str_to_step("A->B")
+    step.set_rate_constant(kf=1)
+    vis = ReactionVisualizer(step)
+    events = [(20, ReactionEvent.SET_CONCENTRATION, ("A", 100))]
+    if robust:
+        df = vis.progress_reaction_robust({"A": 1, "B": 0}, 10, events=events, method="BDF")
+    else:
+        df = vis.progress_reaction({"A": 1, "B": 0}, 10, 100, events=events)
+    assert df["Time"].max() == 10
+    assert abs(df.iloc[-1]["B"] - (1 - np.exp(-10))) <= epsilon
+
+
+def test_event_unknown_species():
+    mechanism = ReactionMechanism.str_to_mechanism("""S+E->C
+                                                   C->E+P""")
+    mechanism.set_rate_constants([{"kf": 1, "kr": 0.05}, {"kf": 0.2}])
+    with pytest.raises(ValueError):
+        ReactionVisualizer(mechanism).progress_reaction({"S": 2, "E": 1, "C": 0, "P": 0}, 10, 100, quasi_steady_state=["C"],
+                                                        events=[(5, ReactionEvent.SET_CONCENTRATION, ("C", 1))])
+
+
+def test_shared_rates():
+    # Both steps have the same rate, which is computed once and counted for each of them
+    mechanism = ReactionMechanism.str_to_mechanism("""A->B
+                                                   A->B""")
+    mechanism.set_rate_constants([{"kf": 1}, {"kf": 1}])
+    df = ReactionVisualizer(mechanism).progress_reaction({"A": 1, "B": 0}, 2, 100)
+    assert abs(df.iloc[-1]["B"] - (1 - np.exp(-4))) <= epsilon
+    body = _get_ode_function_body(mechanism.steps, mechanism.get_stoichiometry(), ["A", "B"], None)
+    assert [line.split(" = ")[0].strip() for line in body if line.lstrip().startswith("r")] == ["r0"]
+    assert "    out[1] = 2*r0" in body
+    # Different rate constants give different rates
+    mechanism.set_rate_constants([{"kf": 1}, {"kf": 2}])
+    body = _get_ode_function_body(mechanism.steps, mechanism.get_stoichiometry(), ["A", "B"], None)
+    assert [line.split(" = ")[0].strip() for line in body if line.lstrip().startswith("r")] == ["r0", "r1"]
+
+
+def test_zero_rate_step():
+    mechanism = ReactionMechanism.str_to_mechanism("""A->B
+                                                   B->C""")
+    mechanism.set_rate_constants([{"kf": 1}, {}])
+    df = ReactionVisualizer(mechanism).progress_reaction({"A": 1, "B": 0, "C": 0}, 2, 100)
+    assert abs(df.iloc[-1]["B"] - (1 - np.exp(-2))) <= epsilon
+    assert df.iloc[-1]["C"] == 0
+
+
+def test_replaced_step():
+    mechanism = ReactionMechanism.str_to_mechanism("""A->B
+                                                   B->C""")
+    mechanism.set_rate_constants([{"kf": 1}, {"kf": 1}])
+    vis = ReactionVisualizer(mechanism)
+    vis.progress_reaction({"A": 1, "B": 0, "C": 0}, 2, 10)
+    replacement = SimpleStep.str_to_step("B->A")
+    replacement.set_rate_constant(kf=1)
+    mechanism.steps[1] = replacement
+    df = vis.progress_reaction({"A": 1, "B": 0, "C": 0}, 2, 10)
+    assert df.iloc[-1]["C"] == 0
+    assert abs(df.iloc[-1]["A"] + df.iloc[-1]["B"] - 1) <= epsilon